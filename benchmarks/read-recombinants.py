@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+
+"""
+Compare the speed (in rows per second) of the ways of reading a 3seq
+recombinant file, and the speed-up of each block decoder reader over the
+line-by-line reader it replaced.
+"""
+
+from __future__ import print_function
+
+import argparse
+from array import array
+from os import close, unlink
+from random import Random
+from tempfile import mkstemp
+from time import time
+
+import numpy as np
+
+from py3seq import readRecombinants
+from py3seq.analysis import (
+    _RECOMBINANTS_HEADER, _checkRecombinantsHeader, _parseRecombinantLine,
+    _readRecombinantsByLine)
+from py3seq.frame import (
+    BREAKPOINT_COLUMNS, RECOMBINANT_COLUMNS, _ID_COLUMNS, _TYPECODES,
+    _iterRecombinantColumns)
+
+# The chunk size used with the column readers.
+CHUNKSIZE = 100000
+
+
+def writeRecombinants(fp, count, sequences, seed):
+    """
+    Write a synthetic 3seq recombinant file.
+
+    @param fp: An open file to write to.
+    @param count: The C{int} number of recombinant lines to write.
+    @param sequences: The C{int} number of distinct sequence ids to use.
+    @param seed: The C{int} random seed.
+    """
+    random = Random(seed)
+    print(_RECOMBINANTS_HEADER, file=fp)
+    for _ in range(count):
+        p = random.random() / 1000.0
+        breakpoints = []
+        for _ in range(random.randint(1, 3)):
+            left1 = random.randint(1, 500)
+            left2 = left1 + random.randint(0, 10)
+            right1 = left2 + random.randint(1, 500)
+            right2 = right1 + random.randint(0, 10)
+            breakpoints.append('%4d-%-4d & %4d-%-4d' %
+                               (left1, left2, right1, right2))
+        print('\t'.join((
+            'seq%d' % random.randrange(sequences),
+            'seq%d' % random.randrange(sequences),
+            'seq%d' % random.randrange(sequences),
+            str(random.randint(0, 50)), str(random.randint(0, 50)),
+            str(random.randint(0, 20)), '%.6e' % p,
+            str(random.randint(0, 1)), '%.4f' % (-10 * p),
+            '%.6e' % p, '%.6e' % min(1.0, p * 1000),
+            str(random.randint(1, 1000)), '\t'.join(breakpoints))), file=fp)
+
+
+def iterRecombinantColumnsByLine(filename, chunksize):
+    """
+    The column reader (py3seq.frame._iterRecombinantColumns) as it was
+    before the block decoder, parsing one line at a time.
+
+    @param filename: The C{str} name of the 3seq recombinant file.
+    @param chunksize: The C{int} maximum number of recombinants per chunk.
+    @return: A generator that yields chunks, as _iterRecombinantColumns.
+    """
+    ids = []
+    idCodes = {}
+
+    def newBuffers(columns):
+        return dict((name, array(_TYPECODES[type_]))
+                    for name, type_ in columns)
+
+    def toArrays(buffers, columns):
+        return dict((name, np.array(buffers[name], dtype=type_))
+                    for name, type_ in columns)
+
+    with open(filename) as fp:
+        _checkRecombinantsHeader(fp)
+
+        start = row = 0
+        columns = newBuffers(RECOMBINANT_COLUMNS)
+        breakpointColumns = newBuffers(BREAKPOINT_COLUMNS)
+
+        for lineNumber, line in enumerate(fp, start=2):
+            values = _parseRecombinantLine(line, lineNumber, filename)
+
+            for name, id_ in zip(_ID_COLUMNS, values[:3]):
+                try:
+                    code = idCodes[id_]
+                except KeyError:
+                    code = idCodes[id_] = len(ids)
+                    ids.append(id_)
+                columns[name].append(code)
+
+            for (name, _), value in zip(RECOMBINANT_COLUMNS[3:],
+                                        values[3:11]):
+                columns[name].append(value)
+
+            for (left1, left2), (right1, right2) in values[11]:
+                breakpointColumns['row'].append(row)
+                breakpointColumns['left1'].append(left1)
+                breakpointColumns['left2'].append(left2)
+                breakpointColumns['right1'].append(right1)
+                breakpointColumns['right2'].append(right2)
+
+            row += 1
+
+            if row - start == chunksize:
+                yield (start, toArrays(columns, RECOMBINANT_COLUMNS),
+                       toArrays(breakpointColumns, BREAKPOINT_COLUMNS), ids)
+                start = row
+                columns = newBuffers(RECOMBINANT_COLUMNS)
+                breakpointColumns = newBuffers(BREAKPOINT_COLUMNS)
+
+        if row > start:
+            yield (start, toArrays(columns, RECOMBINANT_COLUMNS),
+                   toArrays(breakpointColumns, BREAKPOINT_COLUMNS), ids)
+
+
+def recombinantsByLine(filename):
+    for _ in _readRecombinantsByLine(filename):
+        pass
+
+
+def recombinantsByBlock(filename):
+    for _ in readRecombinants(filename):
+        pass
+
+
+def columnsByLine(filename):
+    for _ in iterRecombinantColumnsByLine(filename, CHUNKSIZE):
+        pass
+
+
+def columnsByBlock(filename):
+    for _ in _iterRecombinantColumns(filename, CHUNKSIZE):
+        pass
+
+
+# Pairs of (name, function) for the old (line-by-line) and new (block
+# decoder) version of each reader.
+READERS = (
+    (('Recombinant instances, by line', recombinantsByLine),
+     ('Recombinant instances, by block', recombinantsByBlock)),
+    (('column buffers, by line', columnsByLine),
+     ('column buffers, by block', columnsByBlock)),
+)
+
+
+def bestTime(method, filename, repeat):
+    """
+    Time a way of reading a file.
+
+    @param method: A function that takes a file name and reads the file.
+    @param filename: The C{str} file name.
+    @param repeat: The C{int} number of times to time the method.
+    @return: The C{float} smallest number of seconds taken.
+    """
+    best = None
+    for _ in range(repeat):
+        start = time()
+        method(filename)
+        elapsed = time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+        description=__doc__.strip())
+
+    parser.add_argument(
+        '--recombinantFile',
+        help=('The 3seq recombinant file to read. If not given, a '
+              'synthetic file is made.'))
+
+    parser.add_argument(
+        '--rows', type=int, default=500000,
+        help='The number of rows in the synthetic file.')
+
+    parser.add_argument(
+        '--sequences', type=int, default=1000,
+        help='The number of distinct sequence ids in the synthetic file.')
+
+    parser.add_argument(
+        '--seed', type=int, default=0,
+        help='The random seed for the synthetic file.')
+
+    parser.add_argument(
+        '--repeat', type=int, default=3,
+        help='The number of times to time each method (the best is shown).')
+
+    args = parser.parse_args()
+
+    if args.recombinantFile:
+        filename = args.recombinantFile
+    else:
+        fd, filename = mkstemp(suffix='.3s.rec')
+        close(fd)
+        with open(filename, 'w') as fp:
+            writeRecombinants(fp, args.rows, args.sequences, args.seed)
+
+    try:
+        rows = sum(1 for _ in readRecombinants(filename))
+        print('Reading %d rows from %s' % (rows, filename))
+        for old, new in READERS:
+            times = []
+            for name, method in old, new:
+                times.append(bestTime(method, filename, args.repeat))
+                print('%-34s %10.0f rows/sec' %
+                      (name + ':', rows / times[-1]))
+            print('%-34s %10.2fx' % ('Speed-up:', times[0] / times[1]))
+    finally:
+        if not args.recombinantFile:
+            unlink(filename)
+
+
+if __name__ == '__main__':
+    main()
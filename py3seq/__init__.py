@@ -1,8 +1,11 @@
 # Note that the version string must have the following format, otherwise it
 # will not be found by the version() function in ../setup.py
-__version__ = '1.1.4'
+__version__ = '1.12.0'
 
 from .analysis import RecombinationAnalysis, readRecombinants
+from .frame import iterRecombinantFrames, readRecombinantsFrame
+from .summary import summarizeRecombinants
 
 # Keep Python linters quiet.
-_ = (RecombinationAnalysis, readRecombinants)
+_ = (RecombinationAnalysis, readRecombinants, iterRecombinantFrames,
+     readRecombinantsFrame, summarizeRecombinants)
@@ -1,9 +1,17 @@
-from os.path import join
-from tempfile import mkdtemp
-import shutil
+from itertools import islice
+from math import expm1, log1p
+from os.path import exists, join
+from threading import Lock
+import numpy as np
 import six
 
-from dark.process import Executor
+from dark.fasta import FastaReads
+from dark.reads import Reads
+
+from py3seq.backends import SerialBackend
+from py3seq.limits import RunCancelledError
+from py3seq.scratch import _emptyDir, makeScratchDir, removeScratchDir
+from py3seq.validate import validateAlignment
 
 _OUTPUT_PREFIX = 'output'
 
@@ -12,6 +20,43 @@ _RECOMBINANTS_HEADER = '\t'.join(
      'min_rec_length breakpoints').split())
 
 
+def _tripletCount(nChildren, nSequences):
+    """
+    Get the number of triplets 3seq tests (and so corrects p-values for).
+
+    @param nChildren: The C{int} number of sequences tested as children.
+    @param nSequences: The C{int} total number of sequences.
+    @return: The C{int} number of (ordered parent pair, child) triplets.
+    """
+    return nChildren * max(0, nSequences - 1) * max(0, nSequences - 2)
+
+
+def _dunnSidak(p, n):
+    """
+    Compute the Dunn-Sidak correction of a p-value.
+
+    @param p: The C{float} uncorrected p-value.
+    @param n: The C{int} number of comparisons.
+    @return: The C{float} corrected p-value, 1 - (1 - p) ^ n.
+    """
+    # Use expm1 and log1p to keep precision for tiny p-values.
+    return -expm1(n * log1p(-p)) if p < 1.0 else 1.0
+
+
+def _looserThreshold(t, runCount, subsetCount):
+    """
+    Find a threshold on the Dunn-Sidak corrected p-values of a run with one
+    number of triplets that admits every triplet that would be significant
+    at a given threshold with a different number of triplets.
+
+    @param t: The C{float} threshold for C{subsetCount} triplets.
+    @param runCount: The C{int} number of triplets tested in the run.
+    @param subsetCount: The C{int} number of triplets in the subset.
+    @return: The C{float} threshold for the run.
+    """
+    return _dunnSidak(t, float(runCount) / subsetCount)
+
+
 class RecombinationAnalysis(object):
     """
     Perform a 3seq recombination analysis.
@@ -21,13 +66,107 @@ class RecombinationAnalysis(object):
         manual (mentioned in ../README.md) for how to generate or obtain a
         p-value file.
     @param dryRun: If C{True} do not execute any 3seq commands, just log what
-        would have been run (see self.executor.log for details).
+        would have been run (see self.executor.log for details). Only used
+        if C{backend} is not given.
+    @param backend: A C{py3seq.backends.Backend} instance to run 3seq
+        analyses with. If C{None}, a C{SerialBackend} is used.
+    @param scratchRoot: The C{str} directory to make output directories in
+        (e.g., on a local NVMe disk or tmpfs), or C{None} for the
+        C{scratchRoot} of the backend (the shared directory of a
+        C{JobArrayBackend}, otherwise the default temporary directory).
+        Stale output directories made there on this host (those whose lock
+        file is not locked, see C{py3seq.scratch.cleanStaleScratchDirs})
+        are removed the first time it is used. Not used if C{scratchPool}
+        is given.
+    @param scratchPool: A C{py3seq.scratch.ScratchPool} instance to take
+        output directories from (and return them to), or C{None}.
+    @param keepOnlyRecombinants: If C{True}, remove everything but the
+        main recombinant file (see C{recombinantFile}) from the output
+        directory as soon as a run completes.
+
+    Each run removes the output of the previous run. An instance can be
+    used as a context manager, in which case its output is removed on exit.
     """
 
-    def __init__(self, pValueFile, dryRun=False):
+    def __init__(self, pValueFile, dryRun=False, backend=None,
+                 scratchRoot=None, scratchPool=None,
+                 keepOnlyRecombinants=False):
         self.pValueFile = pValueFile
+        self.scratchPool = scratchPool
+        self.keepOnlyRecombinants = keepOnlyRecombinants
         self.tmpDir = None
-        self.executor = Executor(dryRun=dryRun)
+        self.alignmentStats = None
+        self._results = None
+        # Held while the output directory is set up or read, so that cancel
+        # does not remove it part way through.
+        self._lock = Lock()
+        self.backend = backend or SerialBackend(dryRun=dryRun)
+        self.executor = self.backend.executor
+        self.scratchRoot = (self.backend.scratchRoot if scratchRoot is None
+                            else scratchRoot)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self._removePreviousOutput()
+        self.tmpDir = None
+        return False
+
+    def _removePreviousOutput(self):
+        """
+        Remove the output of the previous run, if any (and if it has not
+        already been removed by C{removeOutput}).
+        """
+        if self.tmpDir is not None and (self.scratchPool is not None or
+                                        exists(self.tmpDir)):
+            self.removeOutput()
+
+    def _makeTmpDir(self):
+        """
+        Make (or, if a scratch pool is in use, acquire) a directory for the
+        3seq input and output, and set self.tmpDir to it. The directory of
+        any previous run is first removed (or returned to the pool).
+        """
+        self._results = None
+        self._removePreviousOutput()
+        if self.scratchPool is None:
+            self.tmpDir = makeScratchDir(self.scratchRoot)
+        else:
+            self.tmpDir = self.scratchPool.acquire()
+
+    def _discardOutput(self):
+        """
+        Remove the output directory of a cancelled run, if any. The caller
+        must hold self._lock.
+        """
+        if self.tmpDir is not None:
+            if self.scratchPool is None:
+                removeScratchDir(self.tmpDir, ignoreErrors=True)
+            else:
+                self.scratchPool.release(self.tmpDir)
+            self.tmpDir = None
+
+    def _checkCancelled(self, what):
+        """
+        Check whether the current run has been cancelled, removing its output
+        directory if so. The caller must hold self._lock.
+
+        @param what: A C{str} description of what is being run, for the
+            error message.
+        @raise RunCancelledError: If the run has been cancelled.
+        """
+        if self.backend.canceller.cancelled:
+            self._discardOutput()
+            raise RunCancelledError(what)
+
+    def _pruneOutput(self):
+        """
+        If C{keepOnlyRecombinants} is C{True}, remove everything but the
+        main recombinant file from the output directory.
+        """
+        if self.keepOnlyRecombinants and not self.executor.dryRun:
+            _emptyDir(self.tmpDir, keep=_OUTPUT_PREFIX + '.3s.rec')
 
     def check(self):
         """
@@ -38,33 +177,309 @@ class RecombinationAnalysis(object):
         """
         return self.executor.execute('3seq -check "%s"' % self.pValueFile)
 
-    def run(self, reads, t=0.05):
+    def run(self, reads, t=0.05, validate=True, limits=None):
         """
-        Run 3seq on some reads. Sets self.tmpDir as a side-effect.
+        Run 3seq on some reads. Sets self.tmpDir (and, if C{validate} is
+        C{True}, self.alignmentStats) as a side-effect. If
+        C{keepOnlyRecombinants} is C{True}, the other output files are
+        removed when 3seq finishes.
 
         @param reads: Either a C{dark.reads.Reads} instance or a C{str}
             filename.
         @param t: A C{str} or C{float} error threshold, e.g. 0.01, '1e-6'
             that will be passed on the command line to 3seq. See section
             7.10 of the 3seq manual for details.
+        @param validate: If C{True}, check that the reads are a valid
+            alignment before running 3seq (see
+            C{py3seq.validate.validateAlignment}).
+        @param limits: A C{py3seq.limits.ResourceLimits} instance or C{None}.
+        @raise InvalidAlignmentError: If C{validate} is C{True} and the reads
+            are not a valid alignment.
+        @raise ResourceLimitError: If 3seq hits a limit in C{limits}.
+        @raise RunCancelledError: If the run is cancelled (see C{cancel}).
         @return: A C{subprocess.CompletedProcess} instance.
         """
-        self.tmpDir = mkdtemp()
+        self.backend.reset()
 
-        if isinstance(reads, six.string_types):
-            inputFile = reads
-        else:
-            inputFile = join(self.tmpDir, 'input.fasta')
-            reads.save(inputFile, format_='fasta')
+        if validate:
+            if not isinstance(reads, six.string_types):
+                # The reads are read twice (to validate and to save them),
+                # which would find no reads the second time if they came
+                # from a generator.
+                reads = Reads(list(reads))
+            self.alignmentStats = validateAlignment(reads)
 
+        with self._lock:
+            self._makeTmpDir()
+
+            if isinstance(reads, six.string_types):
+                inputFile = reads
+            else:
+                inputFile = join(self.tmpDir, 'input.fasta')
+
+            command = self._command(inputFile, t)
+            self._checkCancelled(command)
+
+            if inputFile != reads:
+                reads.save(inputFile, format_='fasta')
+
+        # If the run is cancelled from now on, the backend kills the command
+        # (even if it has not started yet).
+        result = self.backend.execute(command, limits=limits)
+
+        with self._lock:
+            self._checkCancelled(command)
+            self._pruneOutput()
+
+        return result
+
+    def _command(self, inputFile, t, outputPrefix=_OUTPUT_PREFIX,
+                 subsetFile=None):
+        """
+        Make a 3seq command to analyze an input file.
+
+        @param inputFile: The C{str} name of the input file.
+        @param t: A C{str} or C{float} error threshold (see C{run}).
+        @param outputPrefix: The C{str} prefix for the 3seq output files in
+            self.tmpDir.
+        @param subsetFile: If not C{None}, the C{str} name of a file with
+            the ids of the sequences to be tested as children (one per line).
+        @return: A C{str} shell command.
+        """
         # Note that the 3seq manual (as of 2018-12-29) says you can use
         # '-fullrun' but that doesn't work. The source code looks for
         # either -f or -full.  But -f seems ambiguous in the manual (it
         # also means 'first') so I'm going with -full.
-        return self.executor.execute(
-            'echo y | 3seq -full "%s" -ptable "%s" -id "%s" -t%s' %
-            (inputFile, self.pValueFile, join(self.tmpDir, _OUTPUT_PREFIX),
-             str(t)))
+        command = ('echo y | 3seq -full "%s" -ptable "%s" -id "%s" -t%s' %
+                   (inputFile, self.pValueFile,
+                    join(self.tmpDir, outputPrefix), str(t)))
+
+        if subsetFile is not None:
+            command += ' -subset "%s"' % subsetFile
+
+        return command
+
+    def runSweep(self, reads, thresholds, validate=True, limits=None):
+        """
+        Run 3seq once at the loosest of several error thresholds and derive
+        the recombinants that would be found at each of the stricter
+        thresholds from the recorded (Dunn-Sidak corrected) p-values. Sets
+        self.tmpDir as a side-effect (the output is that of the loosest run).
+
+        @param reads: Either a C{dark.reads.Reads} instance or a C{str}
+            filename.
+        @param thresholds: An iterable of C{str} or C{float} error thresholds
+            (see C{run}).
+        @param validate: If C{True}, check that the reads are a valid
+            alignment (see C{run}).
+        @param limits: A C{py3seq.limits.ResourceLimits} instance or C{None}.
+        @raise ValueError: If C{thresholds} is empty.
+        @raise InvalidAlignmentError: If C{validate} is C{True} and the reads
+            are not a valid alignment.
+        @return: A C{dict} keyed by the values in C{thresholds}, with each
+            value a C{list} of the C{Recombinant} instances that 3seq would
+            report if run with that threshold. If this is a dry run, the
+            lists will be empty.
+        """
+        thresholds = list(thresholds)
+        if not thresholds:
+            raise ValueError('No thresholds given')
+
+        self.run(reads, t=max(thresholds, key=float), validate=validate,
+                 limits=limits)
+
+        if self.executor.dryRun:
+            recombinants = []
+        else:
+            with self._lock:
+                self._checkCancelled('3seq sweep')
+                recombinants = list(readRecombinants(self.recombinantFile()))
+
+        result = {}
+        for t in thresholds:
+            threshold = float(t)
+            result[t] = [recombinant for recombinant in recombinants
+                         if recombinant.dsP < threshold]
+
+        return result
+
+    def runSubsets(self, reads, subsets, t=0.05, shards=1, validate=True,
+                   limits=None):
+        """
+        Find the recombinants in each of several (typically overlapping)
+        subsets of a set of sequences, as though 3seq had been run on each
+        subset separately, while testing each triplet only once. Sets
+        self.tmpDir as a side-effect.
+
+        3seq is run on the union of the subsets. The uncorrected p-value of
+        a triplet does not depend on the other sequences, so the Dunn-Sidak
+        correction of each triplet found is recomputed using the number of
+        triplets in each subset it falls in. The threshold passed to 3seq is
+        loosened so that no triplet that is significant in some subset can
+        be missing from its output.
+
+        @param reads: Either a C{dark.reads.Reads} instance or a C{str} FASTA
+            filename.
+        @param subsets: An iterable of iterables of C{str} sequence ids.
+        @param t: A C{str} or C{float} error threshold (see C{run}), to be
+            applied to each subset.
+        @param shards: The C{int} number of 3seq commands to divide the
+            children between (using the 3seq -subset option). The commands
+            are run via self.backend and so may run concurrently. The
+            corrected p-values in the combined recombinant file (see
+            C{recombinantFile}) are for the number of triplets in the whole
+            run, as though it had not been sharded.
+        @param validate: If C{True}, check that the union of the subsets is a
+            valid alignment (see C{run}).
+        @param limits: A C{py3seq.limits.ResourceLimits} instance or C{None}.
+            The limits apply to each shard separately.
+        @raise ValueError: If C{shards} is less than 1, if a subset contains
+            an id that is not in C{reads}, or if no subset has at least three
+            sequences.
+        @raise InvalidAlignmentError: If C{validate} is C{True} and the
+            union of the subsets is not a valid alignment.
+        @return: A C{list} with a C{list} of C{Recombinant} instances for
+            each subset, in the order of C{subsets}. The C{dsP} attribute of
+            each C{Recombinant} is corrected for the number of triplets in
+            its subset. If this is a dry run, the lists will be empty.
+        """
+        if shards < 1:
+            raise ValueError('Number of shards must be at least 1')
+
+        self.backend.reset()
+        subsets = [set(subset) for subset in subsets]
+        union = set().union(*subsets)
+
+        if isinstance(reads, six.string_types):
+            reads = FastaReads(reads)
+
+        unionReads = Reads([read for read in reads if read.id in union])
+        childIds = [read.id for read in unionReads]
+
+        missing = union - set(childIds)
+        if missing:
+            raise ValueError(
+                'Subset sequence id%s not found in reads: %s' %
+                ('' if len(missing) == 1 else 's',
+                 ', '.join(sorted(missing))))
+
+        subsetCounts = [_tripletCount(len(subset), len(subset))
+                        for subset in subsets]
+        if not any(subsetCounts):
+            raise ValueError('No subset has at least three sequences')
+
+        minCount = min(count for count in subsetCounts if count)
+        threshold = float(t)
+        nSequences = len(childIds)
+
+        if validate:
+            self.alignmentStats = validateAlignment(unionReads)
+
+        with self._lock:
+            self._makeTmpDir()
+            inputFile = join(self.tmpDir, 'input.fasta')
+            what = '3seq subsets run in %s' % self.tmpDir
+            self._checkCancelled(what)
+            unionReads.save(inputFile, format_='fasta')
+
+            commands = []
+            outputFiles = []
+            if shards == 1:
+                commands.append(self._command(
+                    inputFile,
+                    _looserThreshold(
+                        threshold, _tripletCount(nSequences, nSequences),
+                        minCount)))
+            else:
+                for shard in range(shards):
+                    shardIds = childIds[shard::shards]
+                    if not shardIds:
+                        continue
+                    subsetFile = join(self.tmpDir, 'subset-%d.txt' % shard)
+                    with open(subsetFile, 'w') as fp:
+                        fp.write('\n'.join(shardIds) + '\n')
+                    outputPrefix = '%s-%d' % (_OUTPUT_PREFIX, shard)
+                    commands.append(self._command(
+                        inputFile,
+                        _looserThreshold(
+                            threshold,
+                            _tripletCount(len(shardIds), nSequences),
+                            minCount),
+                        outputPrefix=outputPrefix, subsetFile=subsetFile))
+                    outputFiles.append(
+                        join(self.tmpDir, outputPrefix + '.3s.rec'))
+
+        # If the run is cancelled from now on, the backend kills the commands
+        # (even those that have not started yet).
+        self.backend.map(commands, limits=limits)
+
+        if self.executor.dryRun:
+            return [[] for _ in subsets]
+
+        with self._lock:
+            self._checkCancelled(what)
+
+            if outputFiles:
+                # Combine the shard output so recombinantFile can be used as
+                # though there had been a single 3seq run. Each shard corrected
+                # its p-values for its own number of triplets, so the DS(p)
+                # columns are recomputed for the number in the whole run. The
+                # shards were run with thresholds that give the same p-value
+                # cutoff, so the set of triplets is as for a single run.
+                unionCount = _tripletCount(nSequences, nSequences)
+                with open(self.recombinantFile(), 'w') as out:
+                    out.write(_RECOMBINANTS_HEADER + '\n')
+                    for outputFile in outputFiles:
+                        with open(outputFile) as fp:
+                            fp.readline()
+                            for line in fp:
+                                fields = line.split('\t', 12)
+                                if len(fields) == 13:
+                                    fields[9] = fields[10] = repr(_dunnSidak(
+                                        float(fields[6]), unionCount))
+                                    line = '\t'.join(fields)
+                                out.write(line)
+
+            self._pruneOutput()
+
+            recombinants = list(readRecombinants(self.recombinantFile()))
+
+        result = []
+        for subset, count in zip(subsets, subsetCounts):
+            found = []
+            if count:
+                for r in recombinants:
+                    if (r.recombinantId in subset and r.pId in subset and
+                            r.qId in subset):
+                        dsP = _dunnSidak(r.p, count)
+                        if dsP < threshold:
+                            found.append(Recombinant(
+                                r.pId, r.qId, r.recombinantId, r.m, r.n, r.k,
+                                r.p, r.hs, r.logp, dsP, r.minRecLength,
+                                r.breakpoints))
+            result.append(found)
+
+        return result
+
+    @property
+    def results(self):
+        """
+        Get lazy access to the 3seq output files. Each is only read when
+        first needed (see C{py3seq.results.ThreeSeqResults}).
+
+        @raise RuntimeError: If no analysis has been run.
+        @return: A C{py3seq.results.ThreeSeqResults} instance.
+        """
+        # Imported here because py3seq.results imports this module.
+        from py3seq.results import ThreeSeqResults
+
+        if self.tmpDir is None:
+            raise RuntimeError('No analysis has been run yet')
+
+        prefix = join(self.tmpDir, _OUTPUT_PREFIX)
+        if self._results is None or self._results.prefix != prefix:
+            self._results = ThreeSeqResults(prefix)
+        return self._results
 
     def recombinantFile(self):
         """
@@ -79,16 +494,32 @@ class RecombinationAnalysis(object):
             # The string in the following is always used by 3seq.
             return join(self.tmpDir, _OUTPUT_PREFIX + '.3s.rec')
 
+    def cancel(self):
+        """
+        Cancel any running 3seq commands (e.g., from another thread), killing
+        their process groups, and remove their output. The interrupted call
+        to C{run} (or C{runSweep} or C{runSubsets}) will raise a
+        C{py3seq.limits.RunCancelledError}.
+        """
+        self.backend.cancel()
+        with self._lock:
+            self._discardOutput()
+
     def removeOutput(self):
         """
-        Remove 3seq output files.
+        Remove 3seq output files. If a scratch pool is in use, the output
+        directory is emptied and returned to the pool, and self.tmpDir is set
+        to C{None}.
 
         @raise RuntimeError: if no analysis has been run.
         """
         if self.tmpDir is None:
             raise RuntimeError('No analysis has been run yet')
+        elif self.scratchPool is None:
+            removeScratchDir(self.tmpDir)
         else:
-            shutil.rmtree(self.tmpDir)
+            self.scratchPool.release(self.tmpDir)
+            self.tmpDir = None
 
 
 class Recombinant(object):
@@ -157,61 +588,303 @@ def readRecombinants(filename):
     @return: A generator that yields C{Recombinant} instances.
     """
     with open(filename) as fp:
-        header = fp.readline()[:-1]
-        if header != _RECOMBINANTS_HEADER:
-            raise ValueError('Unrecognized header line: %s' % header)
+        _checkRecombinantsHeader(fp)
+        for columns in _iterRecombinantBlocks(fp, filename):
+            for values in zip(*(columns[:11] +
+                                (_breakpointTuples(*columns[11:]),))):
+                yield Recombinant(*values)
+
 
-        hsDict = {'0': False, '1': True}
+def _readRecombinantsByLine(filename):
+    """
+    Read a 3seq recombinant file one line at a time. This is the reference
+    implementation of C{readRecombinants}, kept for testing and benchmarking
+    the block decoder.
 
+    @param filename: The C{str} name of the 3seq recombinant file.
+    @raise ValueError, KeyError: As for C{readRecombinants}.
+    @return: A generator that yields C{Recombinant} instances.
+    """
+    with open(filename) as fp:
+        _checkRecombinantsHeader(fp)
         for lineNumber, line in enumerate(fp, start=2):
-            # The 3s.rec output file has a minimum of 13 columns.
-            (pId, qId, cId, m, n, k, p, hs, logp, _, dsP,
-             minRecLength, breakpointsStr) = line.split('\t', maxsplit=12)
-
-            # Explicitly convert to the types we need one by one. This will
-            # cause a more easily locatable error than if we do them all at
-            # once when creating the Recombinant instance below. The dict
-            # in the hs conversion is to force a KeyError if hs is not '0'
-            # or '1'.
-            m = int(m)
-            n = int(n)
-            k = int(k)
-            p = float(p)
-            hs = hsDict[hs]
-            logp = float(logp)
-            dsP = float(dsP)
-            minRecLength = int(minRecLength)
-
-            # Extract all breakpoints pairs. These are separated by TAB and
-            # have their offsets justified by spaces.
-            breakpoints = []
-            for breakpoint in breakpointsStr.split('\t'):
-                breakpoint = breakpoint.strip()
-                if breakpoint:
-                    breakpoints.append(breakpoint)
-
-            breakpointTuples = []
-            if breakpoints:
-                # Breakpoint pairs are split with an ampersand.
-                for breakpoint in breakpoints:
-                    offsetsLeft, offsetsRight = map(
-                        str.strip, breakpoint.split('&'))
-                    # And each of these is an integer range split by '-'.
-                    left1, left2 = map(int, offsetsLeft.split('-'))
-                    right1, right2 = map(int, offsetsRight.split('-'))
-                    # Sanity check
-                    if left1 <= left2 < right1 <= right2:
-                        breakpointTuples.append(
-                            ((left1, left2), (right1, right2)))
-                    else:
-                        raise ValueError(
-                            'Breakpoints (%s) on line %d of %s do not have '
-                            'non-descending indices' %
-                            (breakpoint, lineNumber, filename))
+            yield Recombinant(
+                *_parseRecombinantLine(line, lineNumber, filename))
+
+
+def _checkRecombinantsHeader(fp):
+    """
+    Read and check the header line of a 3seq recombinant file.
+
+    @param fp: An open file positioned at the start of the header line.
+    @raise ValueError: If the header line is not recognized.
+    """
+    header = fp.readline()[:-1]
+    if header != _RECOMBINANTS_HEADER:
+        raise ValueError('Unrecognized header line: %s' % header)
+
+
+_HS = {'0': False, '1': True}
+
+
+def _parseRecombinantLine(line, lineNumber, filename):
+    """
+    Parse a line of a 3seq recombinant file.
+
+    @param line: The C{str} line.
+    @param lineNumber: The C{int} line number, for error messages.
+    @param filename: The C{str} file name, for error messages.
+    @raise ValueError: If a set of breakpoint indices is not non-descending,
+        no breakpoints are found, or the line does not have sufficient
+        fields.
+    @raise KeyError: If C{hs} is not '0' or '1'.
+    @return: A C{tuple} of the arguments needed to make a C{Recombinant}.
+    """
+    # The 3s.rec output file has a minimum of 13 columns.
+    (pId, qId, cId, m, n, k, p, hs, logp, _, dsP,
+     minRecLength, breakpointsStr) = line.split('\t', maxsplit=12)
+
+    # Explicitly convert to the types we need one by one. This will
+    # cause a more easily locatable error than if we do them all at
+    # once when creating the Recombinant instance. The dict in the hs
+    # conversion is to force a KeyError if hs is not '0' or '1'.
+    m = int(m)
+    n = int(n)
+    k = int(k)
+    p = float(p)
+    hs = _HS[hs]
+    logp = float(logp)
+    dsP = float(dsP)
+    minRecLength = int(minRecLength)
+
+    # Extract all breakpoints pairs. These are separated by TAB and
+    # have their offsets justified by spaces.
+    breakpoints = []
+    for breakpoint in breakpointsStr.split('\t'):
+        breakpoint = breakpoint.strip()
+        if breakpoint:
+            breakpoints.append(breakpoint)
+
+    breakpointTuples = []
+    if breakpoints:
+        # Breakpoint pairs are split with an ampersand.
+        for breakpoint in breakpoints:
+            offsetsLeft, offsetsRight = map(
+                str.strip, breakpoint.split('&'))
+            # And each of these is an integer range split by '-'.
+            left1, left2 = map(int, offsetsLeft.split('-'))
+            right1, right2 = map(int, offsetsRight.split('-'))
+            # Sanity check
+            if left1 <= left2 < right1 <= right2:
+                breakpointTuples.append(
+                    ((left1, left2), (right1, right2)))
             else:
-                raise ValueError('No breakpoints found on line %d of %s' %
-                                 (lineNumber, filename))
+                raise ValueError(
+                    'Breakpoints (%s) on line %d of %s do not have '
+                    'non-descending indices' %
+                    (breakpoint, lineNumber, filename))
+    else:
+        raise ValueError('No breakpoints found on line %d of %s' %
+                         (lineNumber, filename))
 
-            yield Recombinant(
-                pId, qId, cId, m, n, k, p, hs, logp, dsP, minRecLength,
-                tuple(breakpointTuples))
+    return (pId, qId, cId, m, n, k, p, hs, logp, dsP, minRecLength,
+            tuple(breakpointTuples))
+
+
+# The number of recombinant file lines to decode at once. The file itself is
+# read through the (large) buffer of the file object. Decoding many more
+# lines at once is slower, not faster, because the number of live objects
+# makes Python's cyclic garbage collector run far more often.
+_BLOCK_LINES = 100
+
+
+def _iterRecombinantBlocks(fp, filename, blockLines=_BLOCK_LINES):
+    """
+    Decode the recombinant lines of a 3seq recombinant file in blocks.
+
+    Each block is decoded column-wise by C{_parseRecombinantBlock}. If that
+    fails, the block is decoded again one line at a time with
+    C{_parseRecombinantLine}, so that the error raised (and the
+    recombinants yielded before it) are exactly those of the line-by-line
+    parser.
+
+    @param fp: An open file positioned just after the header line.
+    @param filename: The C{str} file name, for error messages.
+    @param blockLines: The C{int} maximum number of lines per block.
+    @raise ValueError, KeyError: As for C{readRecombinants}.
+    @return: A generator that yields C{tuple}s of 13 columns (C{tuple}s or
+        C{list}s, each with one value per recombinant). The first 11 are in
+        the order of the arguments needed to make a C{Recombinant}. The
+        12th gives the number of breakpoint pairs of each recombinant, and
+        the 13th is a NumPy array with the left1, left2, right1, and right2
+        indices of all the breakpoint pairs, one after another (see
+        C{_breakpointTuples}).
+    """
+    lineNumber = 2
+    while True:
+        lines = list(islice(fp, blockLines))
+        if not lines:
+            break
+
+        columns = _parseRecombinantBlock(lines)
+        if columns is None:
+            rows = []
+            try:
+                for offset, line in enumerate(lines):
+                    rows.append(_parseRecombinantLine(
+                        line, lineNumber + offset, filename))
+            except (KeyError, ValueError):
+                if rows:
+                    yield _rowsToColumns(rows)
+                raise
+            # The line-by-line parser accepted what the block decoder did
+            # not (e.g., unusual spacing or very large numbers).
+            columns = _rowsToColumns(rows)
+
+        yield columns
+        lineNumber += len(lines)
+
+
+def _rowsToColumns(rows):
+    """
+    Convert recombinant lines parsed by C{_parseRecombinantLine} to the
+    columns given by C{_iterRecombinantBlocks}.
+
+    @param rows: A non-empty C{list} of C{tuple}s returned by
+        C{_parseRecombinantLine}.
+    @return: A C{tuple} of 13 columns.
+    """
+    columns = tuple(zip(*rows))
+    # The breakpoint indices are kept as Python ints (which may be too large
+    # for a NumPy integer type).
+    values = np.array([index for breakpoints in columns[11]
+                       for pair in breakpoints for offsets in pair
+                       for index in offsets], dtype=object)
+    return columns[:11] + ([len(breakpoints) for breakpoints in columns[11]],
+                           values)
+
+
+def _breakpointTuples(counts, values):
+    """
+    Make the breakpoints of recombinants from the breakpoint columns given
+    by C{_iterRecombinantBlocks}.
+
+    @param counts: A C{list} of the C{int} number of breakpoint pairs of
+        each recombinant.
+    @param values: A NumPy array of the C{int} left1, left2, right1, and
+        right2 indices of the breakpoint pairs.
+    @return: A C{list} with a C{tuple} of ((left1, left2), (right1, right2))
+        pairs for each recombinant, as made by C{_parseRecombinantLine}.
+    """
+    indices = iter(values.tolist())
+    pairs = [((left1, left2), (right1, right2))
+             for left1, left2, right1, right2 in zip(
+                 indices, indices, indices, indices)]
+    result = []
+    start = 0
+    for count in counts:
+        result.append(tuple(pairs[start:start + count]))
+        start += count
+    return result
+
+
+_HS_VALUES = frozenset(_HS)
+
+# For checking and decoding breakpoints with str.translate.
+_NO_SPACES = str.maketrans('', '', ' ')
+_NO_DIGITS = str.maketrans('', '', '0123456789')
+_SEPARATORS_TO_SPACES = str.maketrans('&-', '  ')
+
+# Breakpoint indices at least this large are left to the line-by-line
+# parser, so they can be held in 32-bit integer columns.
+_MAX_BREAKPOINT_INDEX = np.iinfo(np.int32).max
+
+
+def _parseRecombinantBlock(lines):
+    """
+    Decode a block of 3seq recombinant file lines column-wise.
+
+    Only lines in the canonical format are decoded. Any line that would
+    need an error (or that might be parsed differently by
+    C{_parseRecombinantLine}) causes C{None} to be returned, so the caller
+    can fall back to line-by-line parsing.
+
+    @param lines: A C{list} of C{str} lines.
+    @return: A C{tuple} of 13 columns (see C{_iterRecombinantBlocks}) or
+        C{None}.
+    """
+    rows = [line.split('\t', 12) for line in lines]
+    if min(map(len, rows)) != 13:
+        return
+
+    (pIds, qIds, cIds, ms, ns, ks, ps, hss, logps, _, dsPs,
+     minRecLengths, breakpointsStrs) = zip(*rows)
+
+    if not _HS_VALUES.issuperset(hss):
+        return
+
+    breakpoints = _parseBreakpointsBlock(breakpointsStrs)
+    if breakpoints is None:
+        return
+
+    try:
+        return (
+            pIds, qIds, cIds,
+            list(map(int, ms)),
+            list(map(int, ns)),
+            list(map(int, ks)),
+            list(map(float, ps)),
+            list(map(_HS.__getitem__, hss)),
+            list(map(float, logps)),
+            list(map(float, dsPs)),
+            list(map(int, minRecLengths)),
+        ) + breakpoints
+    except ValueError:
+        return
+
+
+def _parseBreakpointsBlock(breakpointsStrs):
+    """
+    Decode the breakpoints of a block of 3seq recombinant file lines all at
+    once.
+
+    The breakpoints of all the lines are joined into one string, which is
+    checked (using str.translate) to have only TAB-separated breakpoint
+    pairs in the canonical 'left1-left2 & right1-right2' format, and
+    whose indices are then converted by NumPy.
+
+    @param breakpointsStrs: A C{tuple} of the C{str} breakpoints (the
+        trailing part) of each recombinant line.
+    @return: A 2-tuple with the breakpoint counts and indices (see
+        C{_iterRecombinantBlocks}), or C{None} if any line's breakpoints are
+        missing or not in the canonical format with non-descending indices.
+    """
+    joined = '\t' + '\t'.join(breakpointsStrs)
+    if not joined.endswith('\n'):
+        joined += '\n'
+
+    # Without spaces and digits, each (TAB or newline separated) field
+    # must be '-&-'.
+    withoutSpaces = joined.translate(_NO_SPACES)
+    structure = withoutSpaces.translate(_NO_DIGITS)
+    if '-&--&-' in structure or structure.replace('-&-', '').strip('\t\n'):
+        return
+
+    counts = [breakpointsStr.count('&') for breakpointsStr in breakpointsStrs]
+    if not all(counts):
+        return
+
+    # There must be four indices per pair, both with and without spaces (so
+    # no index is empty or has spaces in it).
+    indexCount = 4 * sum(counts)
+    values = np.fromstring(joined.translate(_SEPARATORS_TO_SPACES),
+                           dtype=np.int64, sep=' ')
+    if (len(values) != indexCount or
+            len(np.fromstring(withoutSpaces.translate(_SEPARATORS_TO_SPACES),
+                              dtype=np.int64, sep=' ')) != indexCount):
+        return
+
+    left1, left2, right1, right2 = values.reshape(-1, 4).T
+    if ((left1 <= left2) & (left2 < right1) & (right1 <= right2)).all() and (
+            right2.max() < _MAX_BREAKPOINT_INDEX):
+        return counts, values
@@ -0,0 +1,462 @@
+from os import environ
+from os.path import exists, getmtime, join
+from multiprocessing.pool import ThreadPool
+from subprocess import CalledProcessError, CompletedProcess, PIPE, run
+from tempfile import mkdtemp
+from time import sleep, time
+import re
+import shutil
+import six
+from six.moves import shlex_quote
+
+from dark.process import Executor
+
+from py3seq.limits import (
+    Canceller, RunCancelledError, TimeoutLimitError, limitError, runLimited)
+
+
+class Backend(object):
+    """
+    Base class for the ways in which 3seq commands can be executed.
+
+    @param dryRun: If C{True} do not execute any commands, just log what
+        would have been run (see self.executor.log for details).
+    """
+
+    # The directory that RecombinationAnalysis should make its scratch
+    # directories in if it is not given one, or None for the default
+    # temporary directory.
+    scratchRoot = None
+
+    def __init__(self, dryRun=False):
+        self.executor = Executor(dryRun=dryRun)
+        self.canceller = Canceller()
+
+    def execute(self, command, limits=None):
+        """
+        Execute a single shell command.
+
+        @param command: The C{str} shell command to execute.
+        @param limits: A C{py3seq.limits.ResourceLimits} instance or C{None}.
+        @raise CalledProcessError: If the command fails.
+        @raise ResourceLimitError: If the command hits a resource limit.
+        @raise RunCancelledError: If the command is cancelled.
+        @return: A C{subprocess.CompletedProcess} instance, or C{None} if
+            this is a dry run.
+        """
+        return self.map([command], limits=limits)[0]
+
+    def map(self, commands, limits=None):
+        """
+        Execute several independent shell commands.
+
+        @param commands: An iterable of C{str} shell commands.
+        @param limits: A C{py3seq.limits.ResourceLimits} instance or C{None}.
+            The limits apply to each command separately.
+        @raise CalledProcessError: If any command fails.
+        @raise ResourceLimitError: If any command hits a resource limit.
+        @raise RunCancelledError: If the commands are cancelled.
+        @return: A C{list} of C{subprocess.CompletedProcess} instances (or
+            C{None} values if this is a dry run), in the order of
+            C{commands}.
+        """
+        raise NotImplementedError('map must be implemented by a subclass')
+
+    def cancel(self):
+        """
+        Cancel all running commands, killing their process groups.
+        """
+        self.canceller.cancel()
+
+    def reset(self):
+        """
+        Allow commands to run again after a cancellation. This is called at
+        the start of each run (not by C{map}), so that a cancellation made
+        while a run is being set up is not lost.
+        """
+        self.canceller.reset()
+
+    def _run(self, command, limits):
+        """
+        Execute a shell command on the local machine.
+
+        @param command: The C{str} shell command to execute.
+        @param limits: A C{py3seq.limits.ResourceLimits} instance or C{None}.
+        @return: A C{subprocess.CompletedProcess} instance, or C{None} if
+            this is a dry run.
+        """
+        if self.executor.dryRun:
+            return self.executor.execute(command)
+        else:
+            return runLimited(command, self.executor.log, limits,
+                              self.canceller)
+
+
+class SerialBackend(Backend):
+    """
+    Execute commands one after another on the local machine.
+
+    @param dryRun: If C{True} do not execute any commands, just log what
+        would have been run (see self.executor.log for details).
+    """
+
+    def map(self, commands, limits=None):
+        return [self._run(command, limits) for command in commands]
+
+
+class PoolBackend(Backend):
+    """
+    Execute commands concurrently on the local machine.
+
+    Each command runs in its own (shell and 3seq) process, so the pool
+    workers only need to wait for those processes to finish. They are
+    therefore threads, which keeps all running commands visible to (and
+    logged by) this process.
+
+    @param processes: The C{int} maximum number of commands to run at once.
+        If C{None}, the number of CPUs is used.
+    @param dryRun: If C{True} do not execute any commands, just log what
+        would have been run (see self.executor.log for details).
+    """
+
+    def __init__(self, processes=None, dryRun=False):
+        Backend.__init__(self, dryRun=dryRun)
+        self.processes = processes
+
+    def map(self, commands, limits=None):
+        pool = ThreadPool(self.processes)
+        try:
+            return pool.map(lambda command: self._run(command, limits),
+                            commands)
+        finally:
+            pool.close()
+            pool.join()
+
+
+# A time written by the times shell builtin, e.g. '1m2.500000s'.
+_TIME = re.compile(r'^(\d+)m(\d+(?:\.\d*)?)s$')
+
+
+def _readCPUTime(filename):
+    """
+    Read the CPU time used by the commands of a shell, as written by the
+    shell's times builtin (e.g., '0m0.310000s 0m0.020000s' for the user and
+    system time of its children, on its second line).
+
+    @param filename: The C{str} name of the file written by times.
+    @return: The C{float} number of CPU seconds, or C{None} if the file
+        does not exist or cannot be parsed.
+    """
+    try:
+        with open(filename) as fp:
+            lines = fp.readlines()
+    except IOError:
+        return
+
+    if len(lines) < 2:
+        return
+
+    cpuTime = 0.0
+    for word in lines[1].split():
+        match = _TIME.match(word)
+        if match is None:
+            return
+        cpuTime += 60 * int(match.group(1)) + float(match.group(2))
+
+    return cpuTime
+
+
+def _elapsed(prefix):
+    """
+    Get the elapsed time of a job array task command, from the modification
+    times of the files written by the task script before and after it.
+
+    @param prefix: The C{str} path prefix of the task files.
+    @return: The C{float} number of seconds, or C{None} if the task files
+        do not exist.
+    """
+    try:
+        return getmtime(prefix + '.times') - getmtime(prefix + '.start')
+    except OSError:
+        return
+
+
+# The default number of seconds to wait for a job array.
+_WEEK = 7 * 24 * 60 * 60.0
+
+
+class JobArrayBackend(Backend):
+    """
+    Execute commands as a job array on a batch scheduler (e.g., SLURM or
+    SGE).
+
+    A shell script is written for each command in a new subdirectory of a
+    directory that must be visible to all compute nodes, together with an
+    array script that runs the script whose index is given by the scheduler
+    in an environment variable. The array script is submitted and the
+    directory is then polled until all tasks have written their exit status.
+    Note that the input and output files of the commands must also be on a
+    shared file system. A C{RecombinationAnalysis} using this backend
+    therefore makes its scratch directories in C{sharedDir} unless it is
+    given another C{scratchRoot}.
+
+    A task that is killed by the scheduler (e.g., for exceeding its wall
+    time) never writes its exit status. If C{submit} returns only once all
+    tasks have finished, such tasks are reported C{lostTaskGrace} seconds
+    after it returns (files written on compute nodes may not be visible
+    straight away on a shared file system such as NFS). Otherwise they are
+    only reported when C{timeout} expires.
+
+    @param sharedDir: The C{str} directory in which to write scripts and
+        collect their output.
+    @param submit: Either a C{str} shell command that will submit a job array,
+        or a function. A command will be formatted with C{script} (the array
+        script path), C{first} and C{last} (the C{int} task ids), and
+        C{count} (the C{int} number of tasks), e.g.,
+        'sbatch --wait --array=%(first)d-%(last)d %(script)s'. A function
+        will be called with the array script path and a C{list} of the
+        C{int} task ids (see C{LocalJobArrayScheduler}).
+    @param submitWaits: C{True} if C{submit} returns only once all tasks
+        have finished. If C{None}, this is C{True} for commands that contain
+        '--wait' (SLURM) or '-sync y' (SGE) and for functions with a true
+        C{waits} attribute (such as C{LocalJobArrayScheduler} instances).
+    @param lostTaskGrace: The C{float} number of seconds to keep waiting
+        for exit status files after C{submit} returns, if C{submitWaits}
+        is C{True}, before reporting the tasks that did not write one.
+    @param taskIdVariable: The C{str} name of the environment variable in
+        which the scheduler gives each task its id.
+    @param firstTaskId: The C{int} id of the first task (SLURM array task
+        ids start from 0, SGE ones from 1).
+    @param pollInterval: The C{float} number of seconds to wait between
+        checks for finished tasks.
+    @param timeout: The C{float} maximum number of seconds to wait for all
+        tasks to finish (by default, one week), or C{None} to wait
+        indefinitely.
+    @param dryRun: If C{True} write the scripts but do not submit them, just
+        log the submission command (see self.executor.log for details).
+    """
+
+    def __init__(self, sharedDir, submit, taskIdVariable='SLURM_ARRAY_TASK_ID',
+                 firstTaskId=0, pollInterval=5.0, timeout=_WEEK,
+                 submitWaits=None, lostTaskGrace=60.0, dryRun=False):
+        Backend.__init__(self, dryRun=dryRun)
+        self.sharedDir = self.scratchRoot = sharedDir
+        self.submit = submit
+        if submitWaits is None:
+            if isinstance(submit, six.string_types):
+                submitWaits = '--wait' in submit or '-sync y' in submit
+            else:
+                submitWaits = bool(getattr(submit, 'waits', False))
+        self.submitWaits = submitWaits
+        self.lostTaskGrace = lostTaskGrace
+        self.taskIdVariable = taskIdVariable
+        self.firstTaskId = firstTaskId
+        self.pollInterval = pollInterval
+        self.timeout = timeout
+
+    def map(self, commands, limits=None):
+        commands = list(commands)
+        if not commands:
+            return []
+
+        jobDir = mkdtemp(dir=self.sharedDir, prefix='py3seq-job-array-')
+        taskIds = list(range(self.firstTaskId,
+                             self.firstTaskId + len(commands)))
+
+        # The job directory is removed if anything fails (including the
+        # submission), but is kept in a dry run so the scripts can be seen.
+        try:
+            for taskId, command in zip(taskIds, commands):
+                self._writeTaskScript(jobDir, taskId, command, limits)
+
+            arrayScript = join(jobDir, 'array.sh')
+            with open(arrayScript, 'w') as fp:
+                fp.write('#!/bin/sh\nexec sh "%s/task-${%s}.sh"\n' %
+                         (jobDir, self.taskIdVariable))
+
+            if self.canceller.cancelled:
+                raise RunCancelledError('job array in %s' % jobDir)
+
+            if isinstance(self.submit, six.string_types):
+                self.executor.execute(self.submit % {
+                    'script': arrayScript,
+                    'first': taskIds[0],
+                    'last': taskIds[-1],
+                    'count': len(taskIds),
+                })
+            elif self.executor.dryRun:
+                self.executor.log.append(
+                    '# Submit %s (tasks %d-%d)' %
+                    (arrayScript, taskIds[0], taskIds[-1]))
+            else:
+                self.submit(arrayScript, taskIds)
+
+            if self.executor.dryRun:
+                return [None] * len(commands)
+
+            self._wait(jobDir, taskIds)
+            return [self._collect(jobDir, taskId, command, limits)
+                    for taskId, command in zip(taskIds, commands)]
+        finally:
+            if not self.executor.dryRun:
+                shutil.rmtree(jobDir)
+
+    def _writeTaskScript(self, jobDir, taskId, command, limits):
+        """
+        Write the shell script for one task of a job array.
+
+        @param jobDir: The C{str} directory to write the script to.
+        @param taskId: The C{int} id of the task.
+        @param command: The C{str} shell command to be run by the task.
+        @param limits: A C{py3seq.limits.ResourceLimits} instance or C{None}.
+        """
+        prefix = join(jobDir, 'task-%d' % taskId)
+
+        with open(prefix + '.cmd', 'w') as fp:
+            fp.write(command + '\n')
+
+        taskCommand = 'sh %s' % shlex_quote(prefix + '.cmd')
+        if limits is not None:
+            # Limits are set by a shell on the compute node, in the same
+            # way as for local commands.
+            taskCommand = 'sh -c %s' % shlex_quote(
+                limits.shellCommand(taskCommand))
+            if limits.timeout is not None:
+                taskCommand = 'timeout -s KILL %s %s' % (limits.timeout,
+                                                         taskCommand)
+
+        with open(prefix + '.sh', 'w') as fp:
+            # The modification times of the start and times files give the
+            # elapsed time of the command, and the second line written by
+            # times is the (user and system) CPU time it used. They are used
+            # to attribute a SIGKILL to a limit (see _collect). The status
+            # file is written under a temporary name and then renamed so it
+            # never appears (to _wait) with partial contents.
+            fp.write(
+                '#!/bin/sh\n'
+                ': > "%s.start"\n'
+                '%s > "%s.out" 2> "%s.err"\n'
+                'status=$?\n'
+                'times > "%s.times"\n'
+                'echo $status > "%s.status.tmp"\n'
+                'mv "%s.status.tmp" "%s.status"\n' %
+                (prefix, taskCommand, prefix, prefix, prefix, prefix,
+                 prefix, prefix))
+
+    def _wait(self, jobDir, taskIds):
+        """
+        Wait for all tasks of a job array to write their exit status.
+
+        @param jobDir: The C{str} directory the tasks write to.
+        @param taskIds: A C{list} of C{int} task ids.
+        @raise RuntimeError: If the tasks do not all finish within
+            C{self.timeout} seconds or, if C{self.submitWaits} is C{True},
+            if some did not write their exit status within
+            C{self.lostTaskGrace} seconds.
+        @raise RunCancelledError: If the job array is cancelled. Note that
+            its tasks must be cancelled via the scheduler.
+        """
+        start = time()
+        pending = set(taskIds)
+        while True:
+            if self.canceller.cancelled:
+                raise RunCancelledError('job array in %s' % jobDir)
+            pending = set(taskId for taskId in pending if not exists(
+                join(jobDir, 'task-%d.status' % taskId)))
+            if not pending:
+                return
+            if (self.submitWaits and
+                    time() - start >= self.lostTaskGrace):
+                raise RuntimeError(
+                    'Job array task%s %s in %s finished without writing %s '
+                    'exit status (%s killed by the scheduler?)' %
+                    ('' if len(pending) == 1 else 's',
+                     ', '.join(map(str, sorted(pending))), jobDir,
+                     'its' if len(pending) == 1 else 'their',
+                     'was it' if len(pending) == 1 else 'were they'))
+            if self.timeout is not None and time() - start > self.timeout:
+                raise RuntimeError(
+                    'Timed out after %.1f seconds waiting for %d job array '
+                    'task%s in %s' % (self.timeout, len(pending),
+                                      '' if len(pending) == 1 else 's',
+                                      jobDir))
+            sleep(self.pollInterval)
+
+    def _collect(self, jobDir, taskId, command, limits):
+        """
+        Collect the result of one finished job array task.
+
+        @param jobDir: The C{str} directory the task wrote to.
+        @param taskId: The C{int} id of the task.
+        @param command: The C{str} shell command run by the task.
+        @param limits: A C{py3seq.limits.ResourceLimits} instance or C{None}.
+        @raise CalledProcessError: If the task command failed.
+        @raise ResourceLimitError: If the task hit a resource limit.
+        @return: A C{subprocess.CompletedProcess} instance.
+        """
+        prefix = join(jobDir, 'task-%d' % taskId)
+        with open(prefix + '.status') as fp:
+            returncode = int(fp.read())
+        with open(prefix + '.out') as fp:
+            stdout = fp.read()
+        with open(prefix + '.err') as fp:
+            stderr = fp.read()
+
+        self.executor.log.extend([
+            '# Job array task %d finished with status %d' %
+            (taskId, returncode),
+            '$ ' + command,
+        ])
+
+        if returncode:
+            # A command killed for using too much CPU time has the same
+            # status (128 + 9) as one killed by timeout(1), or by anything
+            # else that sends SIGKILL, so the CPU and elapsed times are used
+            # to tell which (if any) limit was hit. The elapsed time is given
+            # a second's grace for file systems whose modification times are
+            # in whole seconds.
+            error = limitError(limits, command, returncode, stdout, stderr,
+                               _readCPUTime(prefix + '.times'))
+            elapsed = _elapsed(prefix)
+            if (error is None and limits is not None and
+                    limits.timeout is not None and returncode == 137 and
+                    (elapsed is None or elapsed >= limits.timeout - 1)):
+                error = TimeoutLimitError(limits.timeout, command, stdout,
+                                          stderr)
+            if error:
+                raise error
+            raise CalledProcessError(returncode, command, output=stdout,
+                                     stderr=stderr)
+
+        return CompletedProcess(command, returncode, stdout=stdout,
+                                stderr=stderr)
+
+
+class LocalJobArrayScheduler(object):
+    """
+    A stand-in for a batch scheduler that runs the tasks of a job array one
+    after another on the local machine. Pass an instance as the C{submit}
+    argument of C{JobArrayBackend}.
+
+    @param taskIdVariable: The C{str} name of the environment variable in
+        which to give each task its id.
+    """
+
+    # All tasks have finished when an instance returns (see the
+    # submitWaits argument of JobArrayBackend).
+    waits = True
+
+    def __init__(self, taskIdVariable='SLURM_ARRAY_TASK_ID'):
+        self.taskIdVariable = taskIdVariable
+
+    def __call__(self, script, taskIds):
+        """
+        Run all tasks of a job array.
+
+        @param script: The C{str} path of the job array script.
+        @param taskIds: A C{list} of C{int} task ids.
+        """
+        for taskId in taskIds:
+            env = dict(environ)
+            env[self.taskIdVariable] = str(taskId)
+            run(['sh', script], env=env, stdout=PIPE, stderr=PIPE)
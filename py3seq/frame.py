@@ -0,0 +1,288 @@
+from array import array
+
+import numpy as np
+
+from py3seq.analysis import _checkRecombinantsHeader, _iterRecombinantBlocks
+
+# The recombinant columns, with their (downcast) NumPy types. The sequence
+# id columns are held as int32 codes into a list of ids while reading. The
+# p-values are kept as float64 because they are often far smaller than the
+# smallest float32. log(p) values are printed by 3seq with fewer significant
+# digits than a float32 holds.
+RECOMBINANT_COLUMNS = (
+    ('pId', np.int32),
+    ('qId', np.int32),
+    ('recombinantId', np.int32),
+    ('m', np.int32),
+    ('n', np.int32),
+    ('k', np.int32),
+    ('p', np.float64),
+    ('hs', np.bool_),
+    ('logp', np.float32),
+    ('dsP', np.float64),
+    ('minRecLength', np.int32),
+)
+
+# The breakpoint columns. Each breakpoint pair of a recombinant is a row,
+# with the 'row' column giving the (zero-based) row number of its
+# recombinant.
+BREAKPOINT_COLUMNS = (
+    ('row', np.int32),
+    ('left1', np.int32),
+    ('left2', np.int32),
+    ('right1', np.int32),
+    ('right2', np.int32),
+)
+
+_ID_COLUMNS = ('pId', 'qId', 'recombinantId')
+
+# array.array type codes for the column buffers.
+_TYPECODES = {
+    np.int32: 'i',
+    np.float32: 'f',
+    np.float64: 'd',
+    np.bool_: 'b',
+}
+
+
+def _iterRecombinantColumns(filename, chunksize):
+    """
+    Read a 3seq recombinant file in chunks, parsing directly into column
+    buffers.
+
+    @param filename: The C{str} name of the 3seq recombinant file.
+    @param chunksize: The C{int} maximum number of recombinants per chunk.
+    @raise ValueError, KeyError: As for C{py3seq.readRecombinants}.
+    @return: A generator that yields 4-tuples containing 1) the C{int} row
+        number of the first recombinant in the chunk, 2) a C{dict} mapping
+        the names in C{RECOMBINANT_COLUMNS} to NumPy arrays, 3) a C{dict}
+        mapping the names in C{BREAKPOINT_COLUMNS} to NumPy arrays, and 4) a
+        C{list} of the C{str} sequence ids seen so far (indexed by the codes
+        in the id columns). The same, growing, C{list} is given with every
+        chunk.
+    """
+    if chunksize < 1:
+        raise ValueError('Chunk size must be at least 1')
+
+    ids = []
+    idCodes = {}
+
+    def newBuffers(columns):
+        return dict((name, array(_TYPECODES[type_]))
+                    for name, type_ in columns)
+
+    def toArrays(buffers, columns):
+        return dict((name, np.array(buffers[name], dtype=type_))
+                    for name, type_ in columns)
+
+    def breakpointArrays(pieces):
+        # Each piece is a 2-tuple of a row number array and an array of
+        # (left1, left2, right1, right2) rows.
+        if pieces:
+            rows = np.concatenate([rows for rows, _ in pieces])
+            indices = np.concatenate([indices for _, indices in pieces])
+        else:
+            rows = np.zeros(0)
+            indices = np.zeros((0, 4))
+        result = {'row': rows.astype(np.int32)}
+        for index, (name, type_) in enumerate(BREAKPOINT_COLUMNS[1:]):
+            result[name] = indices[:, index].astype(type_)
+        return result
+
+    with open(filename) as fp:
+        _checkRecombinantsHeader(fp)
+
+        start = row = 0
+        columns = newBuffers(RECOMBINANT_COLUMNS)
+        breakpointPieces = []
+
+        for values in _iterRecombinantBlocks(fp, filename):
+            counts = values[11]
+            indices = values[12].reshape(-1, 4)
+            # The number of breakpoint pairs before each recombinant.
+            pairOffsets = np.concatenate(([0], np.cumsum(counts)))
+
+            # A block may straddle the end of a chunk.
+            offset = 0
+            while offset < len(counts):
+                end = offset + min(len(counts) - offset,
+                                   chunksize - (row - start))
+
+                for name, column in zip(_ID_COLUMNS, values[:3]):
+                    column = column[offset:end]
+                    for id_ in dict.fromkeys(column):
+                        if id_ not in idCodes:
+                            idCodes[id_] = len(ids)
+                            ids.append(id_)
+                    columns[name].extend(map(idCodes.__getitem__, column))
+
+                for (name, _), column in zip(RECOMBINANT_COLUMNS[3:],
+                                             values[3:11]):
+                    columns[name].extend(column[offset:end])
+
+                breakpointPieces.append((
+                    np.repeat(np.arange(row, row + end - offset),
+                              counts[offset:end]),
+                    indices[pairOffsets[offset]:pairOffsets[end]]))
+
+                row += end - offset
+                offset = end
+
+                if row - start == chunksize:
+                    yield (start, toArrays(columns, RECOMBINANT_COLUMNS),
+                           breakpointArrays(breakpointPieces), ids)
+                    start = row
+                    columns = newBuffers(RECOMBINANT_COLUMNS)
+                    breakpointPieces = []
+
+        if row > start:
+            yield (start, toArrays(columns, RECOMBINANT_COLUMNS),
+                   breakpointArrays(breakpointPieces), ids)
+
+
+def _frames(start, columns, breakpointColumns, ids):
+    """
+    Make pandas data frames from recombinant and breakpoint columns.
+
+    @param start: The C{int} row number of the first recombinant.
+    @param columns: A C{dict} of recombinant column arrays.
+    @param breakpointColumns: A C{dict} of breakpoint column arrays.
+    @param ids: A C{list} of C{str} sequence ids, indexed by the codes in
+        the id columns.
+    @return: A 2-tuple of C{pandas.DataFrame}s, with the recombinants and
+        the breakpoints.
+    """
+    import pandas as pd
+
+    categories = pd.Index(ids)
+    data = {}
+    for name, _ in RECOMBINANT_COLUMNS:
+        if name in _ID_COLUMNS:
+            data[name] = pd.Categorical.from_codes(
+                columns[name], categories=categories)
+        else:
+            data[name] = columns[name]
+
+    index = pd.RangeIndex(start, start + len(columns['m']))
+    recombinants = pd.DataFrame(
+        data, index=index, columns=[name for name, _ in RECOMBINANT_COLUMNS])
+    breakpoints = pd.DataFrame(
+        breakpointColumns, columns=[name for name, _ in BREAKPOINT_COLUMNS])
+
+    return recombinants, breakpoints
+
+
+def iterRecombinantFrames(filename, chunksize=100000):
+    """
+    Read a 3seq recombinant file into pandas data frames, in chunks. Memory
+    use is proportional to the chunk size, not the file size (apart from the
+    C{list} of distinct sequence ids).
+
+    The recombinants frame has the columns in C{RECOMBINANT_COLUMNS}, named
+    as the attributes of C{py3seq.analysis.Recombinant}, and is indexed by
+    the (zero-based) row number of each recombinant in the file. The
+    sequence id columns are categoricals. The breakpoints frame has the
+    columns in C{BREAKPOINT_COLUMNS}, in long form.
+
+    The categories of the sequence id columns of each chunk are the ids
+    seen so far, so they usually differ from chunk to chunk (each is a
+    prefix of the next). If chunks are concatenated with C{pandas.concat},
+    the id columns silently become plain strings. To keep them as
+    categoricals, combine them with
+    C{pandas.api.types.union_categoricals}, or use C{readRecombinantsFrame}.
+
+    @param filename: The C{str} name of the 3seq recombinant file.
+    @param chunksize: The C{int} maximum number of recombinants per chunk.
+    @raise ValueError, KeyError: As for C{py3seq.readRecombinants}.
+    @return: A generator that yields 2-tuples of C{pandas.DataFrame}s, with
+        the recombinants and the breakpoints of each chunk.
+    """
+    for start, columns, breakpointColumns, ids in _iterRecombinantColumns(
+            filename, chunksize):
+        yield _frames(start, columns, breakpointColumns, ids)
+
+
+def readRecombinantsFrame(filename, chunksize=100000):
+    """
+    Read a 3seq recombinant file into pandas data frames. See
+    C{iterRecombinantFrames} for a description of the frames.
+
+    @param filename: The C{str} name of the 3seq recombinant file.
+    @param chunksize: The C{int} number of recombinants to parse at a time.
+    @raise ValueError, KeyError: As for C{py3seq.readRecombinants}.
+    @return: A 2-tuple of C{pandas.DataFrame}s, with the recombinants and the
+        breakpoints.
+    """
+    chunks = []
+    breakpointChunks = []
+    ids = []
+    for _, columns, breakpointColumns, ids in _iterRecombinantColumns(
+            filename, chunksize):
+        chunks.append(columns)
+        breakpointChunks.append(breakpointColumns)
+
+    def concatenate(chunks, columns):
+        return dict(
+            (name, np.concatenate([chunk[name] for chunk in chunks])
+             if chunks else np.array([], dtype=type_))
+            for name, type_ in columns)
+
+    return _frames(0, concatenate(chunks, RECOMBINANT_COLUMNS),
+                   concatenate(breakpointChunks, BREAKPOINT_COLUMNS), ids)
+
+
+def writeRecombinantsParquet(filename, recombinantsFile, breakpointsFile,
+                             chunksize=100000):
+    """
+    Convert a 3seq recombinant file to Parquet files, in chunks. Memory use is
+    proportional to the chunk size, not the file size. The files have the
+    columns described in C{iterRecombinantFrames}, except that the
+    recombinants file has an explicit 'row' column instead of an index.
+
+    @param filename: The C{str} name of the 3seq recombinant file.
+    @param recombinantsFile: The C{str} name of the Parquet file to write
+        the recombinants to.
+    @param breakpointsFile: The C{str} name of the Parquet file to write the
+        breakpoints to.
+    @param chunksize: The C{int} maximum number of recombinants per Parquet
+        row group.
+    @raise ValueError, KeyError: As for C{py3seq.readRecombinants}.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    idType = pa.dictionary(pa.int32(), pa.string())
+    recombinantsSchema = pa.schema(
+        [('row', pa.int32())] +
+        [(name, idType if name in _ID_COLUMNS else pa.from_numpy_dtype(type_))
+         for name, type_ in RECOMBINANT_COLUMNS])
+    breakpointsSchema = pa.schema(
+        [(name, pa.from_numpy_dtype(type_))
+         for name, type_ in BREAKPOINT_COLUMNS])
+
+    recombinantsWriter = pq.ParquetWriter(recombinantsFile,
+                                          recombinantsSchema)
+    breakpointsWriter = pq.ParquetWriter(breakpointsFile, breakpointsSchema)
+
+    try:
+        for start, columns, breakpointColumns, ids in (
+                _iterRecombinantColumns(filename, chunksize)):
+            dictionary = pa.array(ids, type=pa.string())
+            arrays = [pa.array(np.arange(start, start + len(columns['m']),
+                                         dtype=np.int32))]
+            for name, _ in RECOMBINANT_COLUMNS:
+                if name in _ID_COLUMNS:
+                    arrays.append(pa.DictionaryArray.from_arrays(
+                        pa.array(columns[name]), dictionary))
+                else:
+                    arrays.append(pa.array(columns[name]))
+            recombinantsWriter.write_table(
+                pa.Table.from_arrays(arrays, schema=recombinantsSchema))
+            breakpointsWriter.write_table(
+                pa.Table.from_arrays(
+                    [pa.array(breakpointColumns[name])
+                     for name, _ in BREAKPOINT_COLUMNS],
+                    schema=breakpointsSchema))
+    finally:
+        recombinantsWriter.close()
+        breakpointsWriter.close()
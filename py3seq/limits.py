@@ -0,0 +1,345 @@
+from os import WEXITSTATUS, WIFSIGNALED, WTERMSIG, killpg, wait4
+from subprocess import CalledProcessError, CompletedProcess, Popen
+from tempfile import TemporaryFile
+from threading import Lock, Timer
+from time import ctime, time
+import signal
+
+from six.moves import shlex_quote
+
+
+class ResourceLimits(object):
+    """
+    Limits on the resources used by a 3seq run. All limits are optional.
+
+    @param timeout: The C{float} maximum number of (wall clock) seconds the
+        run may take.
+    @param cpuTime: The C{int} maximum number of CPU seconds each process of
+        the run may use (set with ulimit -t).
+    @param memory: The C{int} maximum number of bytes of address space each
+        process of the run may use (set, in KiB, with ulimit -v).
+    @param cpus: An iterable of C{int} CPU numbers the run is restricted to
+        (its CPU affinity).
+    @param nice: An C{int} increment to the nice level of the run.
+    """
+
+    def __init__(self, timeout=None, cpuTime=None, memory=None, cpus=None,
+                 nice=None):
+        self.timeout = timeout
+        self.cpuTime = cpuTime
+        self.memory = memory
+        self.cpus = None if cpus is None else set(cpus)
+        self.nice = nice
+
+    def shellCommand(self, command):
+        """
+        Make a shell command that runs a command with the limits (other than
+        the timeout) applied. The limits are set by the shell itself (with
+        ulimit, nice, and taskset), rather than in a preexec_fn, which is not
+        safe to use when the calling process has threads.
+
+        @param command: The C{str} shell command to run.
+        @return: A C{str} shell command. If any of the limits cannot be
+            set, the command is not run and the shell exits with a non-zero
+            status.
+        """
+        setup = []
+        if self.cpuTime is not None:
+            # The soft limit results in SIGXCPU, the hard limit in SIGKILL
+            # (if SIGXCPU is ignored). The soft limit is set first, as the
+            # hard limit cannot be set below the current soft limit.
+            setup.extend([
+                'ulimit -S -t %d' % self.cpuTime,
+                'ulimit -H -t %d' % (self.cpuTime + 1),
+            ])
+        if self.memory is not None:
+            setup.append('ulimit -v %d' % (self.memory // 1024))
+
+        words = []
+        if self.nice is not None:
+            words.extend(['nice', '-n', str(self.nice)])
+        if self.cpus is not None:
+            words.extend(['taskset', '-c',
+                          ','.join(map(str, sorted(self.cpus)))])
+
+        if not (setup or words):
+            return command
+
+        return ' && '.join(setup + [
+            'exec ' + ' '.join(words + ['sh', '-c', shlex_quote(command)])])
+
+
+class ResourceLimitError(RuntimeError):
+    """
+    Indicate that a run was stopped because it hit a resource limit.
+
+    @param limit: The C{str} name of the C{ResourceLimits} attribute whose
+        limit was hit.
+    @param value: The value of the limit.
+    @param command: The C{str} command that was run.
+    @param stdout: The C{str} standard output of the command.
+    @param stderr: The C{str} standard error of the command.
+    """
+
+    def __init__(self, limit, value, command, stdout=None, stderr=None):
+        RuntimeError.__init__(
+            self, 'Command exceeded its %s limit (%s): %s' %
+            (limit, value, command))
+        self.limit = limit
+        self.value = value
+        self.command = command
+        self.stdout = stdout
+        self.stderr = stderr
+
+
+class TimeoutLimitError(ResourceLimitError):
+    """
+    Indicate that a run was stopped because it exceeded its timeout.
+    """
+
+    def __init__(self, value, command, stdout=None, stderr=None):
+        ResourceLimitError.__init__(self, 'timeout', value, command,
+                                    stdout, stderr)
+
+
+class CPUTimeLimitError(ResourceLimitError):
+    """
+    Indicate that a run was stopped because it exceeded its CPU time limit.
+    """
+
+    def __init__(self, value, command, stdout=None, stderr=None):
+        ResourceLimitError.__init__(self, 'cpuTime', value, command,
+                                    stdout, stderr)
+
+
+class MemoryLimitError(ResourceLimitError):
+    """
+    Indicate that a run failed, most likely because it exceeded its memory
+    limit.
+    """
+
+    def __init__(self, value, command, stdout=None, stderr=None):
+        ResourceLimitError.__init__(self, 'memory', value, command,
+                                    stdout, stderr)
+
+
+class RunCancelledError(RuntimeError):
+    """
+    Indicate that a run was cancelled.
+
+    @param command: The C{str} command that was cancelled.
+    """
+
+    def __init__(self, command):
+        RuntimeError.__init__(self, 'Command cancelled: %s' % command)
+        self.command = command
+
+
+class Canceller(object):
+    """
+    Keep track of running process groups so they can be cancelled.
+    """
+
+    def __init__(self):
+        self.cancelled = False
+        self._processes = set()
+        self._lock = Lock()
+
+    def register(self, process):
+        """
+        Register a running process. If a cancellation has already been
+        requested, the process group is killed immediately.
+
+        @param process: A C{subprocess.Popen} instance that leads its own
+            process group.
+        """
+        with self._lock:
+            self._processes.add(process)
+            if self.cancelled:
+                _kill(process)
+
+    def unregister(self, process):
+        """
+        Unregister a process that has finished.
+
+        @param process: A C{subprocess.Popen} instance.
+        """
+        with self._lock:
+            self._processes.discard(process)
+
+    def cancel(self):
+        """
+        Kill the process groups of all registered processes, and of any that
+        are registered later (until C{reset} is called).
+        """
+        with self._lock:
+            self.cancelled = True
+            for process in self._processes:
+                _kill(process)
+
+    def reset(self):
+        """
+        Allow processes to run again after a cancellation.
+        """
+        with self._lock:
+            self.cancelled = False
+
+
+def _kill(process):
+    """
+    Kill the process group of a process.
+
+    @param process: A C{subprocess.Popen} instance that leads its own
+        process group.
+    """
+    try:
+        killpg(process.pid, signal.SIGKILL)
+    except OSError:
+        # The process group has already exited.
+        pass
+
+
+def _signalNumber(returncode):
+    """
+    Find the number of the signal (if any) that ended a shell command.
+
+    @param returncode: The C{int} exit status of the shell. This is negative
+        if the shell was killed by a signal, or 128 plus the signal number if
+        the last command in its pipeline was.
+    @return: An C{int} signal number or C{None}.
+    """
+    if returncode < 0:
+        return -returncode
+    elif returncode > 128:
+        return returncode - 128
+
+
+# Messages (on standard error) that show a command failed to allocate
+# memory: from C++ (e.g., 3seq), from C library calls (ENOMEM), and from
+# Python.
+_MEMORY_ERRORS = ('std::bad_alloc', 'Cannot allocate memory', 'MemoryError')
+
+
+def limitError(limits, command, returncode, stdout, stderr, cpuTime=None):
+    """
+    Find out whether a failed command hit a resource limit.
+
+    A command killed by SIGXCPU hit its CPU time limit, as did one killed by
+    SIGKILL if it used at least that much CPU time (SIGKILL is also used for
+    timeouts and cancellation, and by the kernel when it is out of memory).
+    A command hit its memory limit only if it reported failing to allocate
+    memory: an abort or a segmentation fault has many other causes.
+
+    @param limits: A C{ResourceLimits} instance or C{None}.
+    @param command: The C{str} command that was run.
+    @param returncode: The non-zero C{int} exit status of the command.
+    @param stdout: The C{str} standard output of the command.
+    @param stderr: The C{str} standard error of the command.
+    @param cpuTime: The C{float} number of CPU seconds (user plus system)
+        used by the command, or C{None} if not known.
+    @return: A C{ResourceLimitError} instance or C{None}.
+    """
+    if limits is None:
+        return
+
+    signalNumber = _signalNumber(returncode)
+
+    if limits.cpuTime is not None and (
+            signalNumber == signal.SIGXCPU or
+            (signalNumber == signal.SIGKILL and cpuTime is not None and
+             cpuTime >= limits.cpuTime)):
+        return CPUTimeLimitError(limits.cpuTime, command, stdout, stderr)
+
+    if limits.memory is not None and any(
+            message in stderr for message in _MEMORY_ERRORS):
+        return MemoryLimitError(limits.memory, command, stdout, stderr)
+
+
+def runLimited(command, log, limits=None, canceller=None):
+    """
+    Run a shell command in its own process group, with resource limits, and
+    log it in the style of C{dark.process.Executor}.
+
+    @param command: The C{str} shell command to run.
+    @param log: A C{list} of C{str} log lines to add to.
+    @param limits: A C{ResourceLimits} instance or C{None}.
+    @param canceller: A C{Canceller} instance or C{None}.
+    @raise ResourceLimitError: If the command hits a limit.
+    @raise RunCancelledError: If the command is cancelled.
+    @raise CalledProcessError: If the command otherwise fails.
+    @return: A C{subprocess.CompletedProcess} instance.
+    """
+    start = time()
+    log.extend([
+        '# Start command (shell=True) at %s' % ctime(start),
+        '$ ' + command,
+    ])
+
+    # The output goes to files (rather than pipes that would have to be
+    # read while waiting) so the process can be waited for with wait4,
+    # which gives the CPU time used by it and its descendants.
+    with TemporaryFile('w+') as stdoutFp, TemporaryFile('w+') as stderrFp:
+        process = Popen(
+            command if limits is None else limits.shellCommand(command),
+            shell=True, stdout=stdoutFp, stderr=stderrFp,
+            universal_newlines=True, start_new_session=True)
+
+        if canceller is not None:
+            canceller.register(process)
+
+        timedOut = []
+        if limits is not None and limits.timeout is not None:
+            def timeout():
+                timedOut.append(True)
+                _kill(process)
+            timer = Timer(limits.timeout, timeout)
+            timer.start()
+        else:
+            timer = None
+
+        try:
+            _, status, usage = wait4(process.pid, 0)
+        except BaseException:
+            # E.g., a KeyboardInterrupt. The command is in its own session,
+            # so it would not get the terminal's SIGINT and would be left
+            # running.
+            _kill(process)
+            process.wait()
+            raise
+        finally:
+            if timer is not None:
+                timer.cancel()
+            if canceller is not None:
+                canceller.unregister(process)
+
+        process.returncode = (-WTERMSIG(status) if WIFSIGNALED(status) else
+                              WEXITSTATUS(status))
+        cpuTime = usage.ru_utime + usage.ru_stime
+
+        stdoutFp.seek(0)
+        stdout = stdoutFp.read()
+        stderrFp.seek(0)
+        stderr = stderrFp.read()
+
+    stop = time()
+    log.extend([
+        '# Stop command at %s' % ctime(stop),
+        '# Elapsed = %f seconds' % (stop - start),
+    ])
+
+    if timedOut:
+        raise TimeoutLimitError(limits.timeout, command, stdout, stderr)
+
+    if canceller is not None and canceller.cancelled:
+        raise RunCancelledError(command)
+
+    if process.returncode:
+        error = limitError(limits, command, process.returncode, stdout,
+                           stderr, cpuTime)
+        if error:
+            raise error
+        raise CalledProcessError(process.returncode, command, output=stdout,
+                                 stderr=stderr)
+
+    return CompletedProcess(command, process.returncode, stdout=stdout,
+                            stderr=stderr)
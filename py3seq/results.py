@@ -0,0 +1,146 @@
+from py3seq.analysis import readRecombinants
+
+# The suffixes 3seq adds to the output file prefix given with -id. See
+# section 8 of the 3seq manual.
+LOG_SUFFIX = '.3s.log'
+PVALUE_HISTOGRAM_SUFFIX = '.3s.pvalHist'
+RECOMBINANTS_SUFFIX = '.3s.rec'
+LONG_RECOMBINANTS_SUFFIX = '.3s.longRec'
+
+
+class ThreeSeqLog(object):
+    """
+    Hold the contents of a 3seq log file.
+
+    @param lines: A C{list} of C{str} log lines (without newlines).
+    @param values: A C{dict} mapping C{str} names to C{str} values, from log
+        lines of the form 'name: value' or 'name = value'.
+    """
+
+    def __init__(self, lines, values):
+        self.lines = lines
+        self.values = values
+
+
+def readLog(filename):
+    """
+    Read a 3seq log file.
+
+    @param filename: The C{str} name of the log file.
+    @return: A C{ThreeSeqLog} instance.
+    """
+    lines = []
+    values = {}
+    with open(filename) as fp:
+        for line in fp:
+            line = line.rstrip('\r\n')
+            lines.append(line)
+            for separator in ':', '=':
+                name, found, value = line.partition(separator)
+                if found and name.strip():
+                    values[name.strip()] = value.strip()
+                    break
+
+    return ThreeSeqLog(lines, values)
+
+
+def readPValueHistogram(filename):
+    """
+    Read a 3seq p-value histogram file. Lines whose fields are not all
+    numbers (e.g., headings and comments) are skipped.
+
+    @param filename: The C{str} name of the p-value histogram file.
+    @return: A C{list} of C{tuple}s of C{float}s, one per histogram line.
+    """
+    rows = []
+    with open(filename) as fp:
+        for line in fp:
+            fields = line.split()
+            if fields:
+                try:
+                    rows.append(tuple(map(float, fields)))
+                except ValueError:
+                    pass
+
+    return rows
+
+
+def readLongRecombinants(filename):
+    """
+    Read a 3seq longest recombinant file. This has the same columns as the
+    recombinant file (see C{py3seq.readRecombinants}) and is parsed in the
+    same way.
+
+    @param filename: The C{str} name of the longest recombinant file.
+    @raise ValueError, KeyError: As for C{py3seq.readRecombinants}.
+    @return: A generator that yields C{py3seq.analysis.Recombinant}
+        instances.
+    """
+    return readRecombinants(filename)
+
+
+class ThreeSeqResults(object):
+    """
+    Give lazy access to the output files of a 3seq run. The (small) log and
+    p-value histogram files are parsed on first access and cached. The
+    (potentially large) recombinant files are streamed each time they are
+    read.
+
+    @param prefix: The C{str} output file prefix (as given to 3seq with -id).
+    """
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self._log = None
+        self._pValueHistogram = None
+
+    def filename(self, suffix):
+        """
+        Get the name of a 3seq output file.
+
+        @param suffix: The C{str} file suffix, e.g., C{LOG_SUFFIX}.
+        @return: The C{str} file name.
+        """
+        return self.prefix + suffix
+
+    @property
+    def log(self):
+        """
+        Get the 3seq log.
+
+        @return: A C{ThreeSeqLog} instance.
+        """
+        if self._log is None:
+            self._log = readLog(self.filename(LOG_SUFFIX))
+        return self._log
+
+    @property
+    def pValueHistogram(self):
+        """
+        Get the 3seq p-value histogram.
+
+        @return: A C{list} of C{tuple}s of C{float}s (see
+            C{readPValueHistogram}).
+        """
+        if self._pValueHistogram is None:
+            self._pValueHistogram = readPValueHistogram(
+                self.filename(PVALUE_HISTOGRAM_SUFFIX))
+        return self._pValueHistogram
+
+    def recombinants(self):
+        """
+        Read the 3seq recombinants.
+
+        @return: A generator that yields C{py3seq.analysis.Recombinant}
+            instances.
+        """
+        return readRecombinants(self.filename(RECOMBINANTS_SUFFIX))
+
+    def longRecombinants(self):
+        """
+        Read the 3seq longest recombinants.
+
+        @return: A generator that yields C{py3seq.analysis.Recombinant}
+            instances.
+        """
+        return readLongRecombinants(self.filename(LONG_RECOMBINANTS_SUFFIX))
@@ -0,0 +1,247 @@
+from fcntl import LOCK_EX, LOCK_NB, flock
+from os import (
+    O_CREAT, O_RDONLY, O_WRONLY, close, getpid, listdir, open as osOpen,
+    rename, unlink)
+from os.path import isdir, islink, join
+from socket import gethostname
+from tempfile import gettempdir, mkdtemp
+from threading import Lock
+import errno
+import shutil
+
+from six.moves import queue
+
+# All scratch directory names start with this, followed by the host name and
+# process id of their creator (so stale directories can be recognized) and
+# the random suffix added by mkdtemp (which never contains a '-').
+SCRATCH_PREFIX = 'py3seq-'
+
+# The name of the lock file in each scratch directory. The process using a
+# directory holds an exclusive flock on its lock file for as long as the
+# directory exists, so a directory whose lock can be taken is stale.
+LOCK_FILE = '.lock'
+
+# The open lock file descriptors of the scratch directories of this
+# process, by directory path.
+_lockFds = {}
+_lockFdsLock = Lock()
+
+# The scratch roots that have been cleaned of stale directories by this
+# process.
+_cleanedRoots = set()
+_cleanedRootsLock = Lock()
+
+
+def _scratchPrefix():
+    """
+    Get the scratch directory name prefix for this process.
+
+    @return: A C{str} prefix.
+    """
+    return '%s%s-%d-' % (SCRATCH_PREFIX, gethostname(), getpid())
+
+
+def _tryLock(fd):
+    """
+    Try to take an exclusive lock on an open file, without waiting.
+
+    @param fd: The C{int} file descriptor.
+    @return: C{True} if the lock was taken, else C{False}.
+    """
+    try:
+        flock(fd, LOCK_EX | LOCK_NB)
+    except (IOError, OSError) as e:
+        if e.errno in (errno.EAGAIN, errno.EACCES):
+            return False
+        raise
+    else:
+        return True
+
+
+def cleanStaleScratchDirs(root=None):
+    """
+    Remove the scratch directories made on this host by processes that no
+    longer exist (e.g., workers that crashed before removing their output).
+
+    A directory is only removed if the lock on its lock file can be taken,
+    i.e., if the process that made it no longer holds the lock. Directories
+    without a lock file are left alone. Process ids are not used, as they
+    are not unique across PID namespaces (e.g., containers on one host).
+
+    @param root: The C{str} directory holding scratch directories, or
+        C{None} for the default temporary directory.
+    @return: A C{list} of the C{str} paths of the directories removed.
+    """
+    root = root or gettempdir()
+    prefix = '%s%s-' % (SCRATCH_PREFIX, gethostname())
+    removed = []
+
+    for name in listdir(root):
+        if not name.startswith(prefix):
+            continue
+        try:
+            int(name[len(prefix):].rsplit('-', 1)[0])
+        except ValueError:
+            continue
+        path = join(root, name)
+        if not isdir(path) or islink(path):
+            continue
+        try:
+            fd = osOpen(join(path, LOCK_FILE), O_RDONLY)
+        except OSError:
+            # There is no lock file (or the directory has just been
+            # removed by another process).
+            continue
+        try:
+            if _tryLock(fd):
+                shutil.rmtree(path, ignore_errors=True)
+                removed.append(path)
+        finally:
+            close(fd)
+
+    return removed
+
+
+def _cleanOnce(root):
+    """
+    Remove stale scratch directories from a root, the first time the root is
+    used by this process.
+
+    @param root: The C{str} directory holding scratch directories, or
+        C{None} for the default temporary directory.
+    """
+    root = root or gettempdir()
+    with _cleanedRootsLock:
+        if root in _cleanedRoots:
+            return
+        _cleanedRoots.add(root)
+    cleanStaleScratchDirs(root)
+
+
+def makeScratchDir(root=None):
+    """
+    Make a scratch directory, holding the lock on its lock file until it is
+    removed with C{removeScratchDir} (or this process exits). The first time
+    a root is used by this process, stale scratch directories are removed
+    from it.
+
+    @param root: The C{str} directory to make the scratch directory in (e.g.,
+        on a local NVMe disk or tmpfs), or C{None} for the default temporary
+        directory.
+    @return: The C{str} path of the new directory.
+    """
+    _cleanOnce(root)
+    path = mkdtemp(prefix=_scratchPrefix(), dir=root)
+    # The lock file is locked before it is given its name, so another
+    # process can never take the lock of a directory that is in use.
+    tmpLockFile = join(path, LOCK_FILE + '.tmp')
+    fd = osOpen(tmpLockFile, O_WRONLY | O_CREAT, 0o600)
+    flock(fd, LOCK_EX | LOCK_NB)
+    rename(tmpLockFile, join(path, LOCK_FILE))
+    with _lockFdsLock:
+        _lockFds[path] = fd
+    return path
+
+
+def removeScratchDir(path, ignoreErrors=False):
+    """
+    Remove a scratch directory made by C{makeScratchDir}, and release its
+    lock.
+
+    @param path: The C{str} path of the directory.
+    @param ignoreErrors: If C{True}, ignore errors removing the directory.
+    """
+    if ignoreErrors:
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        shutil.rmtree(path)
+    with _lockFdsLock:
+        fd = _lockFds.pop(path, None)
+    if fd is not None:
+        close(fd)
+
+
+def _emptyDir(path, keep=None):
+    """
+    Remove the contents of a directory, but not the directory itself (or
+    its lock file).
+
+    @param path: The C{str} path of the directory.
+    @param keep: The C{str} name of another entry in the directory to keep,
+        or C{None}.
+    """
+    for name in listdir(path):
+        if name in (keep, LOCK_FILE):
+            continue
+        entry = join(path, name)
+        if isdir(entry) and not islink(entry):
+            shutil.rmtree(entry)
+        else:
+            unlink(entry)
+
+
+class ScratchPool(object):
+    """
+    Manage a pool of pre-created scratch directories that can be reused by
+    many 3seq runs (e.g., by all the C{RecombinationAnalysis} instances of a
+    worker process). A pool can be used as a context manager, in which case
+    its directories are removed on exit.
+
+    @param size: The C{int} number of directories in the pool.
+    @param root: The C{str} directory to make the pool directories in, or
+        C{None} for the default temporary directory.
+    @raise ValueError: If C{size} is less than 1.
+    """
+
+    def __init__(self, size, root=None):
+        if size < 1:
+            raise ValueError('Scratch pool size must be at least 1')
+        self.root = root
+        self.dirs = [makeScratchDir(root) for _ in range(size)]
+        self._free = queue.Queue()
+        for path in self.dirs:
+            self._free.put(path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+        return False
+
+    def acquire(self, timeout=None):
+        """
+        Get an empty directory from the pool, waiting for one to be released
+        if necessary.
+
+        @param timeout: The C{float} maximum number of seconds to wait, or
+            C{None} to wait indefinitely.
+        @raise RuntimeError: If no directory is released within C{timeout}
+            seconds.
+        @return: The C{str} path of the directory.
+        """
+        try:
+            return self._free.get(timeout=timeout)
+        except queue.Empty:
+            raise RuntimeError('No scratch directory was released within %s '
+                               'seconds' % timeout)
+
+    def release(self, path):
+        """
+        Empty a directory and return it to the pool.
+
+        @param path: The C{str} path of a directory given by C{acquire}.
+        @raise ValueError: If C{path} is not a directory of this pool.
+        """
+        if path not in self.dirs:
+            raise ValueError('%r is not a directory of this scratch pool' %
+                             path)
+        _emptyDir(path)
+        self._free.put(path)
+
+    def close(self):
+        """
+        Remove all the directories of the pool.
+        """
+        for path in self.dirs:
+            removeScratchDir(path, ignoreErrors=True)
@@ -0,0 +1,290 @@
+from collections import Counter
+
+import numpy as np
+import six
+
+from py3seq.analysis import _dunnSidak, readRecombinants
+from py3seq.frame import _iterRecombinantColumns
+
+
+class ChildSummary(object):
+    """
+    Summarize the recombinant triplets found for one child sequence.
+
+    @param recombinantId: The C{str} id of the child sequence.
+    """
+
+    def __init__(self, recombinantId):
+        self.recombinantId = recombinantId
+        self.count = 0
+        self.hsCount = 0
+        self.bestPId = self.bestQId = self.bestDsP = None
+        self.parentPairs = set()
+        self.parentCounts = Counter()
+
+    def _best(self, pId, qId, dsP):
+        """
+        Update the best (lowest corrected p-value) triplet.
+
+        @param pId: The C{str} id of parent p.
+        @param qId: The C{str} id of parent q.
+        @param dsP: The C{float} Dunn-Sidak corrected p-value.
+        """
+        if self.bestDsP is None or dsP < self.bestDsP:
+            self.bestPId = pId
+            self.bestQId = qId
+            self.bestDsP = dsP
+
+    def add(self, recombinant, dsP=None):
+        """
+        Add a recombinant triplet.
+
+        @param recombinant: A C{py3seq.analysis.Recombinant} instance.
+        @param dsP: The C{float} corrected p-value of the triplet, or
+            C{None} to use that of C{recombinant}.
+        """
+        self.count += 1
+        self.hsCount += recombinant.hs
+        self._best(recombinant.pId, recombinant.qId,
+                   recombinant.dsP if dsP is None else dsP)
+        self.parentPairs.add(
+            tuple(sorted((recombinant.pId, recombinant.qId))))
+        self.parentCounts[recombinant.pId] += 1
+        self.parentCounts[recombinant.qId] += 1
+
+    def merge(self, other):
+        """
+        Merge in another summary of the same child.
+
+        @param other: A C{ChildSummary} instance.
+        """
+        self.count += other.count
+        self.hsCount += other.hsCount
+        if other.bestDsP is not None:
+            self._best(other.bestPId, other.bestQId, other.bestDsP)
+        self.parentPairs.update(other.parentPairs)
+        self.parentCounts.update(other.parentCounts)
+
+    def significantPairs(self):
+        """
+        Get the number of distinct (unordered) parent pairs.
+
+        @return: An C{int} count.
+        """
+        return len(self.parentPairs)
+
+    def mostFrequentParents(self, n=None):
+        """
+        Get the parents that appear most often in this child's triplets.
+
+        @param n: The C{int} number of parents to return, or C{None} for all.
+        @return: A C{list} of (C{str} parent id, C{int} count) pairs, most
+            frequent first.
+        """
+        return self.parentCounts.most_common(n)
+
+
+class RecombinantSummary(object):
+    """
+    Summarize recombinant triplets, per child and across all children.
+
+    The corrected p-values 3seq gives are only comparable within the output
+    of one 3seq command, because each is corrected for the number of
+    triplets that command tested. To summarize several outputs (e.g., the
+    shards of a run using the 3seq -subset option), give C{tripletCount} so
+    that the p-values are corrected in the same way.
+
+    @param t: If not C{None}, a C{float} threshold. Only triplets whose
+        Dunn-Sidak corrected p-value is less than C{t} will be summarized.
+    @param tripletCount: If not C{None}, the C{int} number of triplets to
+        correct the uncorrected p-value of each triplet for, instead of
+        using the corrected p-value given by 3seq.
+    """
+
+    def __init__(self, t=None, tripletCount=None):
+        self.t = t
+        self.tripletCount = tripletCount
+        self.count = 0
+        self.hsCount = 0
+        self.children = {}
+        self.parentCounts = Counter()
+
+    def _child(self, recombinantId):
+        """
+        Get the summary of a child, creating it if necessary.
+
+        @param recombinantId: The C{str} id of the child sequence.
+        @return: A C{ChildSummary} instance.
+        """
+        try:
+            return self.children[recombinantId]
+        except KeyError:
+            child = self.children[recombinantId] = ChildSummary(
+                recombinantId)
+            return child
+
+    def add(self, recombinant):
+        """
+        Add a recombinant triplet.
+
+        @param recombinant: A C{py3seq.analysis.Recombinant} instance.
+        """
+        if self.tripletCount is None:
+            dsP = recombinant.dsP
+        else:
+            dsP = _dunnSidak(recombinant.p, self.tripletCount)
+
+        if self.t is None or dsP < self.t:
+            self.count += 1
+            self.hsCount += recombinant.hs
+            self.parentCounts[recombinant.pId] += 1
+            self.parentCounts[recombinant.qId] += 1
+            self._child(recombinant.recombinantId).add(recombinant, dsP)
+
+    def addColumns(self, columns, ids):
+        """
+        Add a chunk of recombinant triplets, grouping them by child with
+        NumPy.
+
+        @param columns: A C{dict} of recombinant column arrays, as produced
+            by C{py3seq.frame._iterRecombinantColumns}.
+        @param ids: A C{list} of C{str} sequence ids, indexed by the codes in
+            the id columns of C{columns}.
+        """
+        childCodes = columns['recombinantId']
+        pCodes = columns['pId']
+        qCodes = columns['qId']
+        hs = columns['hs']
+
+        if self.tripletCount is None:
+            dsP = columns['dsP']
+        else:
+            # As in py3seq.analysis._dunnSidak.
+            p = columns['p']
+            with np.errstate(divide='ignore', invalid='ignore'):
+                dsP = np.where(
+                    p < 1.0, -np.expm1(self.tripletCount * np.log1p(-p)),
+                    1.0)
+
+        if self.t is not None:
+            keep = dsP < self.t
+            childCodes, pCodes, qCodes, dsP, hs = (
+                childCodes[keep], pCodes[keep], qCodes[keep], dsP[keep],
+                hs[keep])
+
+        if not len(childCodes):
+            return
+
+        self.count += len(childCodes)
+        self.hsCount += int(hs.sum())
+
+        # Per-child counts.
+        nIds = len(ids)
+        counts = np.bincount(childCodes, minlength=nIds)
+        hsCounts = np.bincount(childCodes, weights=hs, minlength=nIds)
+        for code in np.flatnonzero(counts):
+            child = self._child(ids[code])
+            child.count += int(counts[code])
+            child.hsCount += int(hsCounts[code])
+
+        # The best triplet of each child is the first of its rows once they
+        # are sorted by child and then corrected p-value.
+        order = np.lexsort((dsP, childCodes))
+        sortedCodes = childCodes[order]
+        firsts = order[np.flatnonzero(
+            np.concatenate(([True], sortedCodes[1:] != sortedCodes[:-1])))]
+        for row in firsts:
+            self.children[ids[childCodes[row]]]._best(
+                ids[pCodes[row]], ids[qCodes[row]], float(dsP[row]))
+
+        # Distinct (unordered) parent pairs of each child.
+        pairs = np.unique(np.stack(
+            (childCodes, np.minimum(pCodes, qCodes),
+             np.maximum(pCodes, qCodes)), axis=1), axis=0)
+        for childCode, lowCode, highCode in pairs:
+            self.children[ids[childCode]].parentPairs.add(
+                (ids[lowCode], ids[highCode]))
+
+        # Parent counts of each child, and overall.
+        parents, parentCounts = np.unique(np.stack(
+            (np.concatenate((childCodes, childCodes)),
+             np.concatenate((pCodes, qCodes))), axis=1),
+            axis=0, return_counts=True)
+        for (childCode, parentCode), count in zip(parents, parentCounts):
+            self.children[ids[childCode]].parentCounts[ids[parentCode]] += (
+                int(count))
+
+        totals = np.bincount(np.concatenate((pCodes, qCodes)),
+                             minlength=nIds)
+        for code in np.flatnonzero(totals):
+            self.parentCounts[ids[code]] += int(totals[code])
+
+    def merge(self, other):
+        """
+        Merge in another summary (e.g., of a different 3seq output file).
+
+        @param other: A C{RecombinantSummary} instance.
+        @raise ValueError: If the summaries have different thresholds or
+            triplet counts.
+        @return: This C{RecombinantSummary} instance.
+        """
+        if self.t != other.t:
+            raise ValueError('Cannot merge summaries with different '
+                             'thresholds (%s and %s)' % (self.t, other.t))
+        if self.tripletCount != other.tripletCount:
+            raise ValueError('Cannot merge summaries with different '
+                             'triplet counts (%s and %s)' %
+                             (self.tripletCount, other.tripletCount))
+        self.count += other.count
+        self.hsCount += other.hsCount
+        self.parentCounts.update(other.parentCounts)
+        for recombinantId, child in other.children.items():
+            self._child(recombinantId).merge(child)
+        return self
+
+    def mostFrequentParents(self, n=None):
+        """
+        Get the parents that appear most often across all triplets.
+
+        @param n: The C{int} number of parents to return, or C{None} for all.
+        @return: A C{list} of (C{str} parent id, C{int} count) pairs, most
+            frequent first.
+        """
+        return self.parentCounts.most_common(n)
+
+
+def summarizeRecombinants(filenames, t=None, chunksize=None,
+                          tripletCount=None):
+    """
+    Summarize one or more 3seq recombinant files in a single pass.
+
+    @param filenames: Either a C{str} file name or an iterable of them (e.g.,
+        the output files of a sharded run).
+    @param t: If not C{None}, a C{float} threshold. Only triplets whose
+        Dunn-Sidak corrected p-value is less than C{t} will be summarized.
+    @param chunksize: If not C{None}, the C{int} number of recombinants to
+        read at a time and group with NumPy, which is faster for large files.
+        Otherwise, recombinants are summarized one at a time.
+    @param tripletCount: If not C{None}, the C{int} total number of triplets
+        tested (e.g., by all the shards of a run) to correct p-values for.
+        Otherwise, the corrected p-values in the files are used, and these
+        are only comparable if the files are from 3seq commands that tested
+        the same number of triplets. See C{RecombinantSummary}.
+    @raise ValueError, KeyError: As for C{py3seq.readRecombinants}.
+    @return: A C{RecombinantSummary} instance.
+    """
+    if isinstance(filenames, six.string_types):
+        filenames = [filenames]
+
+    summary = RecombinantSummary(t, tripletCount)
+
+    for filename in filenames:
+        if chunksize is None:
+            for recombinant in readRecombinants(filename):
+                summary.add(recombinant)
+        else:
+            for _, columns, _, ids in _iterRecombinantColumns(filename,
+                                                              chunksize):
+                summary.addColumns(columns, ids)
+
+    return summary
@@ -0,0 +1,283 @@
+import numpy as np
+import six
+
+# Byte lookup tables for (upper-cased) alignment characters. 3seq treats
+# '-' and '.' as gaps and the IUPAC ambiguity codes (and '?') as unknown
+# nucleotides.
+_UPPER = np.frombuffer(bytes(bytearray(range(256))).upper(), dtype=np.uint8)
+_NUCLEOTIDES = np.zeros(256, dtype=bool)
+_NUCLEOTIDES[bytearray(b'ACGTU')] = True
+_GAPS = np.zeros(256, dtype=bool)
+_GAPS[bytearray(b'-.')] = True
+_AMBIGUITIES = np.zeros(256, dtype=bool)
+_AMBIGUITIES[bytearray(b'RYKMSWBDHVN?')] = True
+_LEGAL = _NUCLEOTIDES | _GAPS | _AMBIGUITIES
+
+# The maximum number of examples to give when describing a problem.
+_MAX_EXAMPLES = 5
+
+
+class InvalidAlignmentError(ValueError):
+    """
+    Indicate that an alignment cannot be analyzed by 3seq.
+
+    @param source: A C{str} description of the alignment (e.g., its file
+        name).
+    @param problems: A C{list} of C{str} problem descriptions.
+    """
+
+    def __init__(self, source, problems):
+        ValueError.__init__(self, 'Invalid alignment %s: %s' %
+                            (source, '; '.join(problems)))
+        self.source = source
+        self.problems = problems
+
+
+class AlignmentStats(object):
+    """
+    Hold summary statistics of a (valid) alignment.
+
+    @param ids: A C{list} of C{str} sequence ids.
+    @param length: The C{int} alignment length.
+    @param columnGaps: A NumPy C{int} array with the number of gaps in each
+        alignment column.
+    @param columnAmbiguities: A NumPy C{int} array with the number of
+        ambiguous nucleotides in each alignment column.
+    @param sequenceGaps: A NumPy C{int} array with the number of gaps in each
+        sequence.
+    """
+
+    def __init__(self, ids, length, columnGaps, columnAmbiguities,
+                 sequenceGaps):
+        self.ids = ids
+        self.length = length
+        self.columnGaps = columnGaps
+        self.columnAmbiguities = columnAmbiguities
+        self.sequenceGaps = sequenceGaps
+
+    def gapFraction(self):
+        """
+        Get the fraction of each alignment column that is gaps.
+
+        @return: A NumPy C{float} array.
+        """
+        return self.columnGaps / float(len(self.ids))
+
+    def ambiguityFraction(self):
+        """
+        Get the fraction of each alignment column that is ambiguous.
+
+        @return: A NumPy C{float} array.
+        """
+        return self.columnAmbiguities / float(len(self.ids))
+
+
+def _examples(items):
+    """
+    Format a few examples of a problem.
+
+    @param items: A C{list} of C{str} examples.
+    @return: A C{str} listing (at most _MAX_EXAMPLES of) C{items}.
+    """
+    result = ', '.join(items[:_MAX_EXAMPLES])
+    if len(items) > _MAX_EXAMPLES:
+        result += ', ... (%d more)' % (len(items) - _MAX_EXAMPLES)
+    return result
+
+
+def _parseFasta(data, problems):
+    """
+    Split FASTA data into ids and sequences.
+
+    @param data: The C{bytes} FASTA data.
+    @param problems: A C{list} to append C{str} problem descriptions to.
+    @return: A 2-tuple with a C{list} of C{str} ids and a C{list} of
+        C{bytes} sequences.
+    """
+    data = data.lstrip()
+    if not data.startswith(b'>'):
+        problems.append("FASTA data does not start with '>'")
+        return [], []
+
+    ids = []
+    sequences = []
+    for record in data[1:].split(b'\n>'):
+        header, _, sequence = record.partition(b'\n')
+        ids.append(header.strip().decode('utf-8', 'replace'))
+        sequences.append(sequence.translate(None, b' \t\r\n'))
+    return ids, sequences
+
+
+def _parseSequentialPhylip(lines, count, length):
+    """
+    Split the lines of a sequential PHYLIP alignment, whose sequences may
+    continue over several lines, into ids and sequences.
+
+    @param lines: A C{list} of the non-blank C{bytes} lines after the header.
+    @param count: The C{int} number of sequences given in the header.
+    @param length: The C{int} alignment length given in the header.
+    @return: A 2-tuple with a C{list} of C{str} ids and a C{list} of
+        C{bytes} sequences, or C{None} if the lines are not a sequential
+        alignment of C{count} sequences of length C{length}.
+    """
+    ids = []
+    sequences = []
+    index = 0
+    while index < len(lines) and len(ids) < count:
+        fields = lines[index].split()
+        sequence = b''.join(fields[1:])
+        index += 1
+        while len(sequence) < length and index < len(lines):
+            sequence += lines[index].translate(None, b' \t\r')
+            index += 1
+        if len(sequence) != length:
+            return
+        ids.append(fields[0].decode('utf-8', 'replace'))
+        sequences.append(sequence)
+
+    if index == len(lines) and len(ids) == count:
+        return ids, sequences
+
+
+def _parsePhylip(data, problems):
+    """
+    Split (sequential or interleaved, relaxed) PHYLIP data into ids and
+    sequences. The data is read as sequential if that gives the number and
+    length of sequences in the header, else as interleaved.
+
+    @param data: The C{bytes} PHYLIP data.
+    @param problems: A C{list} to append C{str} problem descriptions to.
+    @return: A 2-tuple with a C{list} of C{str} ids and a C{list} of
+        C{bytes} sequences.
+    """
+    lines = [line for line in data.splitlines() if line.strip()]
+    if not lines:
+        return [], []
+
+    try:
+        count, length = map(int, lines[0].split()[:2])
+    except ValueError:
+        count = 0
+
+    if count < 1:
+        problems.append('unrecognized PHYLIP header line %r' %
+                        lines[0].decode('utf-8', 'replace'))
+        return [], []
+
+    sequential = _parseSequentialPhylip(lines[1:], count, length)
+    if sequential:
+        return sequential
+
+    ids = []
+    sequences = []
+    for line in lines[1:count + 1]:
+        fields = line.split()
+        ids.append(fields[0].decode('utf-8', 'replace'))
+        sequences.append(b''.join(fields[1:]))
+
+    # Any further lines are blocks of an interleaved alignment.
+    for index, line in enumerate(lines[count + 1:]):
+        sequences[index % count] += line.translate(None, b' \t\r')
+
+    if len(ids) != count:
+        problems.append('PHYLIP header gives %d sequences but %d were found' %
+                        (count, len(ids)))
+    if any(len(sequence) != length for sequence in sequences):
+        problems.append('PHYLIP header gives an alignment length of %d' %
+                        length)
+
+    return ids, sequences
+
+
+def validateAlignment(reads, format_=None):
+    """
+    Check that an alignment can be analyzed by 3seq. The sequences are
+    checked together (in a single NumPy byte array) for equal length, legal
+    characters, and not being all gaps, and their ids for uniqueness.
+
+    @param reads: Either a C{dark.reads.Reads} instance or a C{str} FASTA or
+        PHYLIP file name.
+    @param format_: The C{str} file format, either 'fasta' or 'phylip'. If
+        C{None}, the format will be guessed from the first character of the
+        file.
+    @raise InvalidAlignmentError: If the alignment is not valid.
+    @raise ValueError: If C{format_} is not recognized.
+    @return: An C{AlignmentStats} instance.
+    """
+    problems = []
+
+    if isinstance(reads, six.string_types):
+        source = reads
+        with open(reads, 'rb') as fp:
+            data = fp.read()
+        if format_ is None:
+            format_ = 'fasta' if data.lstrip()[:1] == b'>' else 'phylip'
+        if format_ == 'fasta':
+            ids, sequences = _parseFasta(data, problems)
+        elif format_ == 'phylip':
+            ids, sequences = _parsePhylip(data, problems)
+        else:
+            raise ValueError('Unknown alignment format %r' % format_)
+    else:
+        source = '(reads)'
+        ids = []
+        sequences = []
+        for read in reads:
+            ids.append(read.id)
+            sequences.append(read.sequence.encode('ascii', 'backslashreplace'))
+
+    if len(ids) < 3:
+        problems.append('at least three sequences are needed, found %d' %
+                        len(ids))
+        raise InvalidAlignmentError(source, problems)
+
+    lengths = np.array([len(sequence) for sequence in sequences])
+    offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    characters = _UPPER[np.frombuffer(b''.join(sequences), dtype=np.uint8)]
+
+    uniqueIds, idCounts = np.unique(np.array(ids, dtype=object),
+                                    return_counts=True)
+    duplicates = [str(id_) for id_ in uniqueIds[idCounts > 1]]
+    if duplicates:
+        problems.append('duplicate sequence ids: ' + _examples(duplicates))
+
+    length = int(np.bincount(lengths).argmax())
+    unequal = np.flatnonzero(lengths != length)
+    if len(unequal):
+        problems.append(
+            'sequence lengths differ from the most common length (%d): %s' %
+            (length, _examples(['%s (%d)' % (ids[i], lengths[i])
+                                for i in unequal])))
+
+    illegal = np.flatnonzero(~_LEGAL[characters])
+    if len(illegal):
+        # Map the positions of the illegal characters back to sequences.
+        sequenceIndices = np.searchsorted(offsets, illegal, side='right') - 1
+        firstIndices = np.unique(sequenceIndices, return_index=True)[1]
+        problems.append('illegal characters: ' + _examples([
+            '%r at position %d of %s' % (
+                chr(characters[illegal[i]]),
+                illegal[i] - offsets[sequenceIndices[i]] + 1,
+                ids[sequenceIndices[i]])
+            for i in firstIndices]))
+
+    gaps = _GAPS[characters]
+    # np.add.reduceat cannot handle empty sequences, so count gaps using
+    # the cumulative sum.
+    gapCumsum = np.concatenate(([0], np.cumsum(gaps)))
+    sequenceGaps = gapCumsum[offsets + lengths] - gapCumsum[offsets]
+    allGaps = np.flatnonzero(sequenceGaps == lengths)
+    if len(allGaps):
+        problems.append('sequences with no nucleotides: ' +
+                        _examples([ids[i] for i in allGaps]))
+
+    if problems:
+        raise InvalidAlignmentError(source, problems)
+
+    matrix = characters.reshape((len(ids), length))
+
+    return AlignmentStats(
+        ids, length,
+        _GAPS[matrix].sum(axis=0),
+        _AMBIGUITIES[matrix].sum(axis=0),
+        sequenceGaps)
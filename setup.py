@@ -43,8 +43,15 @@ setup(name='py3seq',
                    'recombination detection program.'),
       install_requires=[
           'dark-matter>=3.0.48',
+          'numpy',
       ],
       extras_require={
+        'pandas': [
+            'pandas',
+        ],
+        'parquet': [
+            'pyarrow',
+        ],
         'dev': [
             'flake8',
             'pytest',
@@ -1,4 +1,5 @@
 from unittest import TestCase
+import re
 from six import assertRaisesRegex
 from six.moves import builtins
 from os.path import join
@@ -16,7 +17,10 @@ from dark.process import Executor
 from dark.reads import Read, Reads
 
 from py3seq import RecombinationAnalysis, readRecombinants
-from py3seq.analysis import _OUTPUT_PREFIX, _RECOMBINANTS_HEADER
+from py3seq.backends import Backend
+from py3seq.analysis import (
+    _OUTPUT_PREFIX, _RECOMBINANTS_HEADER, _checkRecombinantsHeader, _dunnSidak,
+    _iterRecombinantBlocks, _parseBreakpointsBlock, _readRecombinantsByLine)
 
 
 class TestAnalysis(TestCase):
@@ -140,6 +144,345 @@ class TestAnalysis(TestCase):
         self.ra.removeOutput()
         rmtreeMock.assert_called_once_with(self.ra.tmpDir)
 
+    def testRunSweepMatchesIndependentRuns(self):
+        """
+        The recombinants found by runSweep for each threshold must be the
+        same as those found by running 3seq independently at that threshold.
+        """
+        reads = Reads([
+            Read('id1', 'A' * 200 + 'G' * 200),
+            Read('id2', 'A' * 400),
+            Read('id3', 'G' * 400),
+        ])
+        thresholds = (0.05, 0.01, '1e-6')
+        sweep = self.ra.runSweep(reads, thresholds)
+        self.assertEqual(set(thresholds), set(sweep))
+
+        for t in thresholds:
+            ra = RecombinationAnalysis(TestAnalysis._tableFile)
+            ra.run(reads, t=t)
+            try:
+                expected = [
+                    (r.pId, r.qId, r.recombinantId, r.p, r.dsP)
+                    for r in readRecombinants(ra.recombinantFile())]
+            finally:
+                ra.removeOutput()
+            self.assertEqual(
+                expected,
+                [(r.pId, r.qId, r.recombinantId, r.p, r.dsP)
+                 for r in sweep[t]])
+
+    def testRunSubsetsMatchesIndependentRuns(self):
+        """
+        The recombinants found by runSubsets for each subset must be the same
+        as those found by running 3seq independently on that subset.
+        """
+        reads = Reads([
+            Read('id1', 'A' * 200 + 'G' * 200),
+            Read('id2', 'A' * 400),
+            Read('id3', 'G' * 400),
+            Read('id4', 'G' * 200 + 'A' * 200),
+            Read('id5', 'A' * 100 + 'G' * 300),
+        ])
+        subsets = [['id1', 'id2', 'id3'], ['id2', 'id3', 'id4', 'id5'],
+                   ['id1', 'id2', 'id3', 'id4', 'id5']]
+
+        for shards in 1, 2:
+            result = self.ra.runSubsets(reads, subsets, shards=shards)
+            self.ra.removeOutput()
+
+            for subset, found in zip(subsets, result):
+                ra = RecombinationAnalysis(TestAnalysis._tableFile)
+                ra.run(Reads([read for read in reads if read.id in subset]))
+                try:
+                    expected = sorted(
+                        (r.pId, r.qId, r.recombinantId, r.p)
+                        for r in readRecombinants(ra.recombinantFile()))
+                    dsPs = dict(
+                        ((r.pId, r.qId, r.recombinantId), r.dsP)
+                        for r in readRecombinants(ra.recombinantFile()))
+                finally:
+                    ra.removeOutput()
+                self.assertEqual(
+                    expected,
+                    sorted((r.pId, r.qId, r.recombinantId, r.p)
+                           for r in found))
+                for r in found:
+                    self.assertAlmostEqual(
+                        dsPs[r.pId, r.qId, r.recombinantId], r.dsP)
+
+        self.ra.tmpDir = None
+
+
+class TestRun(TestCase):
+    """
+    Tests for the C{py3seq.RecombinationAnalysis.run} method that do not
+    need 3seq.
+    """
+    def testValidatedReadsFromGenerator(self):
+        """
+        Reads from a generator must all be saved as the 3seq input when they
+        are also validated.
+        """
+        def reads():
+            yield Read('id1', 'A' * 200 + 'G' * 200)
+            yield Read('id2', 'A' * 400)
+            yield Read('id3', 'G' * 400)
+
+        ra = RecombinationAnalysis('table', dryRun=True)
+        ra.run(Reads(reads()))
+        with open(join(ra.tmpDir, 'input.fasta')) as fp:
+            data = fp.read()
+        ra.removeOutput()
+        self.assertEqual(
+            '>id1\n%s\n>id2\n%s\n>id3\n%s\n' % (
+                'A' * 200 + 'G' * 200, 'A' * 400, 'G' * 400), data)
+        self.assertEqual(3, len(ra.alignmentStats.ids))
+
+
+class TestRunSweep(TestCase):
+    """
+    Tests for the C{py3seq.RecombinationAnalysis.runSweep} method that do
+    not need 3seq to be installed.
+    """
+    def setUp(self):
+        self.ra = RecombinationAnalysis('table')
+
+    def tearDown(self):
+        if self.ra.tmpDir:
+            self.ra.removeOutput()
+
+    def testNoThresholds(self):
+        """
+        If no thresholds are given, runSweep must raise a ValueError.
+        """
+        error = '^No thresholds given$'
+        assertRaisesRegex(self, ValueError, error, self.ra.runSweep,
+                          'input.fasta', [])
+
+    def testDryRun(self):
+        """
+        In a dry run, runSweep must run 3seq with the loosest threshold and
+        return an empty list of recombinants for each threshold.
+        """
+        ra = RecombinationAnalysis('table', dryRun=True)
+        result = ra.runSweep('input.fasta', ['1e-6', 0.05, 0.01],
+                             validate=False)
+        ra.removeOutput()
+        self.assertEqual({'1e-6': [], 0.05: [], 0.01: []}, result)
+        self.assertTrue(ra.executor.log[-1].endswith(' -t0.05'))
+
+    def testFiltering(self):
+        """
+        The recombinants for each threshold must be those whose corrected
+        p-value is less than the threshold.
+        """
+        mockOpener = mockOpen(read_data='\n'.join((
+            _RECOMBINANTS_HEADER,
+            'id1 id2 id3 0 1 6 0.001 1 -3.0 0.04 0.04 6 '.replace(' ', '\t') +
+            '1-3 & 4-6',
+            'id1 id2 id4 0 1 6 0.0001 1 -4.0 0.005 0.005 6 '.replace(
+                ' ', '\t') + '1-3 & 4-6',
+            'id1 id2 id5 0 1 6 1e-9 1 -9.0 1e-7 1e-7 6 '.replace(
+                ' ', '\t') + '1-3 & 4-6',
+        )) + '\n')
+        with patch.object(self.ra.backend, 'execute') as executeMock:
+            with patch.object(builtins, 'open', mockOpener):
+                result = self.ra.runSweep('input.fasta', [0.01, 0.05, 1e-6],
+                                          validate=False)
+
+        self.assertEqual(1, executeMock.call_count)
+        self.assertTrue(executeMock.call_args[0][0].endswith(' -t0.05'))
+        self.assertEqual(
+            {
+                0.05: ['id3', 'id4', 'id5'],
+                0.01: ['id4', 'id5'],
+                1e-6: ['id5'],
+            },
+            dict((t, [r.recombinantId for r in recombinants])
+                 for t, recombinants in result.items()))
+
+
+class _RecordingBackend(Backend):
+    """
+    A backend that records the commands it is given and, instead of running
+    3seq, writes a fixed set of recombinant lines (restricted to the
+    children in any -subset file) to each command's output file.
+
+    @param lines: A C{list} of C{str} recombinant lines (without newlines).
+    """
+    def __init__(self, lines):
+        Backend.__init__(self)
+        self.lines = lines
+        self.commands = []
+
+    def map(self, commands, limits=None):
+        for command in commands:
+            self.commands.append(command)
+            outputPrefix = re.search(r' -id "([^"]+)"', command).group(1)
+            match = re.search(r' -subset "([^"]+)"', command)
+            if match:
+                with open(match.group(1)) as fp:
+                    children = set(fp.read().split())
+            else:
+                children = None
+            with open(outputPrefix + '.3s.rec', 'w') as fp:
+                fp.write(_RECOMBINANTS_HEADER + '\n')
+                for line in self.lines:
+                    if children is None or line.split()[2] in children:
+                        fp.write(line + '\n')
+        return [None] * len(commands)
+
+
+class TestRunSubsets(TestCase):
+    """
+    Tests for the C{py3seq.RecombinationAnalysis.runSubsets} method that do
+    not need 3seq to be installed.
+    """
+    READS = Reads([
+        Read('id1', 'A' * 200 + 'G' * 200),
+        Read('id2', 'A' * 400),
+        Read('id3', 'G' * 400),
+        Read('id4', 'G' * 200 + 'A' * 200),
+        Read('id5', 'C' * 400),
+    ])
+
+    LINES = [
+        # A triplet with all sequences in both subsets below.
+        'id2 id3 id1 0 1 6 1e-4 1 -4.0 0.0 0.0 6 '.replace(' ', '\t') +
+        '1-3 & 4-6',
+        # A triplet with all sequences in just the second subset below.
+        'id2 id3 id4 0 1 6 1e-4 1 -4.0 0.0 0.0 6 '.replace(' ', '\t') +
+        '1-3 & 4-6',
+        # A triplet with a parent in neither subset.
+        'id5 id3 id1 0 1 6 1e-9 1 -9.0 0.0 0.0 6 '.replace(' ', '\t') +
+        '1-3 & 4-6',
+    ]
+
+    def setUp(self):
+        self.ra = RecombinationAnalysis(
+            'table', backend=_RecordingBackend(self.LINES))
+
+    def tearDown(self):
+        if self.ra.tmpDir:
+            self.ra.removeOutput()
+
+    def testUnknownId(self):
+        """
+        If a subset contains an id that is not in the reads, runSubsets must
+        raise a ValueError.
+        """
+        error = '^Subset sequence ids not found in reads: id7, id8$'
+        assertRaisesRegex(self, ValueError, error, self.ra.runSubsets,
+                          self.READS, [['id1', 'id7', 'id8']])
+
+    def testNoSubsetLargeEnough(self):
+        """
+        If no subset has at least three sequences, runSubsets must raise a
+        ValueError.
+        """
+        error = '^No subset has at least three sequences$'
+        assertRaisesRegex(self, ValueError, error, self.ra.runSubsets,
+                          self.READS, [['id1', 'id2'], ['id3']])
+
+    def testDryRun(self):
+        """
+        In a dry run, runSubsets must return an empty list for each subset.
+        """
+        ra = RecombinationAnalysis('table', dryRun=True)
+        result = ra.runSubsets(self.READS, [['id1', 'id2', 'id3']] * 2)
+        ra.removeOutput()
+        self.assertEqual([[], []], result)
+
+    def testUnionAnalyzedOnce(self):
+        """
+        A single 3seq command must be run on the union of the subsets, with
+        a threshold loosened for the number of triplets in the union
+        relative to that in the smallest subset.
+        """
+        self.ra.runSubsets(
+            self.READS, [['id1', 'id2', 'id3'], ['id1', 'id2', 'id3', 'id4']],
+            t=0.05)
+        (command,) = self.ra.backend.commands
+        with open(join(self.ra.tmpDir, 'input.fasta')) as fp:
+            ids = [line[1:-1] for line in fp if line.startswith('>')]
+        self.assertEqual(['id1', 'id2', 'id3', 'id4'], ids)
+        # The union has 4 * 3 * 2 = 24 triplets, the smallest subset has
+        # 3 * 2 * 1 = 6.
+        t = float(re.search(r' -t(\S+)', command).group(1))
+        self.assertAlmostEqual(1.0 - 0.95 ** 4, t)
+        self.assertNotIn('-subset', command)
+
+    def testPerSubsetCorrection(self):
+        """
+        Each subset must contain only the triplets whose sequences are all in
+        the subset, with Dunn-Sidak corrections for the number of triplets in
+        the subset.
+        """
+        small, large = self.ra.runSubsets(
+            self.READS, [['id1', 'id2', 'id3'], ['id1', 'id2', 'id3', 'id4']])
+        self.assertEqual(['id1'], [r.recombinantId for r in small])
+        self.assertAlmostEqual(1.0 - (1.0 - 1e-4) ** 6, small[0].dsP)
+        self.assertEqual(['id1', 'id4'], [r.recombinantId for r in large])
+        for r in large:
+            self.assertAlmostEqual(1.0 - (1.0 - 1e-4) ** 24, r.dsP)
+
+    def testThresholdAppliedPerSubset(self):
+        """
+        The threshold must be applied to the per-subset corrected p-values.
+        """
+        # With 6 triplets, p = 1e-4 corrects to about 6e-4, and with 24
+        # triplets to about 2.4e-3.
+        small, large = self.ra.runSubsets(
+            self.READS, [['id1', 'id2', 'id3'], ['id1', 'id2', 'id3', 'id4']],
+            t=1e-3)
+        self.assertEqual(['id1'], [r.recombinantId for r in small])
+        self.assertEqual([], large)
+
+    def testShards(self):
+        """
+        When sharded, one 3seq command must be run per shard with a -subset
+        file and the shard output must be combined in the recombinant file.
+        """
+        small, large = self.ra.runSubsets(
+            self.READS, [['id1', 'id2', 'id3'], ['id1', 'id2', 'id3', 'id4']],
+            shards=3)
+        self.assertEqual(3, len(self.ra.backend.commands))
+        for command in self.ra.backend.commands:
+            self.assertIn(' -subset "', command)
+        self.assertEqual(['id1'], [r.recombinantId for r in small])
+        self.assertEqual(['id1', 'id4'], [r.recombinantId for r in large])
+        self.assertEqual(
+            ['id1', 'id1', 'id4'],
+            sorted(r.recombinantId
+                   for r in readRecombinants(self.ra.recombinantFile())))
+
+    def testShardsCorrectedForUnion(self):
+        """
+        The corrected p-values in the combined recombinant file of a sharded
+        run must be for the number of triplets in the whole run.
+        """
+        self.ra.runSubsets(
+            self.READS, [['id1', 'id2', 'id3'], ['id1', 'id2', 'id3', 'id4']],
+            shards=2)
+        unionCount = 4 * 3 * 2
+        recombinants = list(readRecombinants(self.ra.recombinantFile()))
+        self.assertEqual(3, len(recombinants))
+        for r in recombinants:
+            self.assertEqual(_dunnSidak(r.p, unionCount), r.dsP)
+        with open(self.ra.recombinantFile()) as fp:
+            fp.readline()
+            fields = fp.readline().split('\t')
+        self.assertEqual(fields[9], fields[10])
+
+    def testNoShards(self):
+        """
+        A number of shards less than 1 must result in a ValueError.
+        """
+        error = '^Number of shards must be at least 1$'
+        assertRaisesRegex(self, ValueError, error, self.ra.runSubsets,
+                          self.READS, [['id1', 'id2', 'id3']], shards=0)
+
 
 class TestReadRecombinants(TestCase):
     """
@@ -479,3 +822,201 @@ class TestReadRecombinants(TestCase):
                 ((11, 13), (51, 63))
             ),
             recombinant2.breakpoints)
+
+
+def _recombinantLine(index, breakpoints=' 1-3 &  4-6\t10-12 & 50-62'):
+    """
+    Make a recombinant file line.
+
+    @param index: An C{int} used to make the line's values distinct.
+    @param breakpoints: The C{str} breakpoints part of the line.
+    @return: A C{str} line (without a newline).
+    """
+    return '\t'.join((
+        'id%d' % (index % 7), 'id%d' % (index % 5), 'id%d' % (index % 3),
+        str(index), str(index + 1), str(index + 2), '%d.5e-7' % index,
+        str(index % 2), '-%d.25' % index, '0.0', '%d.5e-3' % index,
+        str(index + 3), breakpoints))
+
+
+def _outcome(reader, filename):
+    """
+    Read a recombinant file, noting what was read and any error.
+
+    @param reader: A function that takes a file name and returns a generator
+        of C{Recombinant} instances.
+    @param filename: The C{str} name of the recombinant file.
+    @return: A 2-tuple with a C{list} of the attribute C{dict}s of the
+        recombinants read and a 2-tuple with the C{type} and message of the
+        error raised (or C{None}).
+    """
+    recombinants = []
+    try:
+        for recombinant in reader(filename):
+            recombinants.append(vars(recombinant))
+    except Exception as e:
+        return recombinants, (type(e), str(e))
+    else:
+        return recombinants, None
+
+
+class TestRecombinantBlocks(TestCase):
+    """
+    Tests for the block decoding of recombinant files, which must give
+    exactly the same results and errors as the line-by-line parser.
+    """
+    def setUp(self):
+        self.tmpDir = mkdtemp()
+        self.filename = join(self.tmpDir, 'output.3s.rec')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def write(self, lines):
+        """
+        Write the recombinant file.
+
+        @param lines: A C{list} of C{str} recombinant lines.
+        """
+        with open(self.filename, 'w') as fp:
+            fp.write('\n'.join([_RECOMBINANTS_HEADER] + lines) + '\n')
+
+    def assertSameOutcome(self):
+        """
+        Reading the recombinant file with readRecombinants must give the same
+        recombinants and error as reading it line by line.
+        """
+        self.assertEqual(_outcome(_readRecombinantsByLine, self.filename),
+                         _outcome(readRecombinants, self.filename))
+
+    def testManyLines(self):
+        """
+        A file of many lines must be read as by the line-by-line parser.
+        """
+        self.write([_recombinantLine(index) for index in range(25000)])
+        recombinants, error = _outcome(readRecombinants, self.filename)
+        self.assertIsNone(error)
+        self.assertEqual(25000, len(recombinants))
+        self.assertSameOutcome()
+
+    def testBlocks(self):
+        """
+        Blocks must contain the expected columns, with a short final block.
+        """
+        self.write([_recombinantLine(index) for index in range(5)])
+        with open(self.filename) as fp:
+            _checkRecombinantsHeader(fp)
+            blocks = list(_iterRecombinantBlocks(fp, self.filename, 2))
+        self.assertEqual([2, 2, 1], [len(block[0]) for block in blocks])
+        self.assertEqual(('id0', 'id1'), tuple(blocks[0][0]))
+        self.assertEqual([0, 1], list(blocks[0][3]))
+        self.assertEqual([False], list(blocks[2][7]))
+        self.assertEqual([2, 2], blocks[0][11])
+        self.assertEqual([1, 3, 4, 6, 10, 12, 50, 62] * 2,
+                         blocks[0][12].tolist())
+
+    def testErrorInLaterBlock(self):
+        """
+        If a line in a later block is invalid, the recombinants before it
+        must be returned before the line-by-line parser's error is raised.
+        """
+        lines = [_recombinantLine(index) for index in range(15000)]
+        lines[12345] = _recombinantLine(12345, '5-4 & 6-7')
+        lines[12346] = _recombinantLine(12346).replace('\t1\t', '\t2\t')
+        self.write(lines)
+        recombinants, error = _outcome(readRecombinants, self.filename)
+        self.assertEqual(12345, len(recombinants))
+        self.assertEqual(
+            (ValueError, 'Breakpoints (5-4 & 6-7) on line 12347 of %s do '
+             'not have non-descending indices' % self.filename), error)
+        self.assertSameOutcome()
+
+    def testFirstOfSeveralErrors(self):
+        """
+        If a block has several invalid lines, the error for the first must
+        be raised, even if a later one is in an earlier column.
+        """
+        self.write([
+            _recombinantLine(0),
+            _recombinantLine(1, '1-2'),
+            _recombinantLine(2).replace('\t2\t3\t', '\tx\t3\t'),
+        ])
+        recombinants, error = _outcome(readRecombinants, self.filename)
+        self.assertEqual(1, len(recombinants))
+        self.assertIs(ValueError, error[0])
+        self.assertSameOutcome()
+
+    def testUnusualBreakpoints(self):
+        """
+        Unusual breakpoints must be read (or rejected) exactly as by the
+        line-by-line parser.
+        """
+        for breakpoints in ('1-2&3-4', ' 1 - 2 & 3 - 4 ', '1-2 & 3-4\t\t',
+                            '\t1-2 & 3-4', '1-1 & 2-2', '+1-2 & 3-4',
+                            '1_0-2_0 & 3_0-4_0', '', ' ', '\t', '1-2',
+                            '1-2 & 3-4 & 5-6', '1-2-3 & 4-5', '1 & 2-3-4',
+                            '1-2 & 3-4-5', '1-2 & 3', '-1-2 & 3-4',
+                            '1 2-3 & 4-5', '1-2\t& 3-4', '1-2 3-4 & 5-6',
+                            'a-2 & 3-4', '1-2 & 3-4\tb', '3-4 & 1-2',
+                            '1-2 & 3 4-', '1-2 & 3-99999999999999999999',
+                            '1-2 & 3-4\r', '1-2 & 3-4\t5-6 & 7-8'):
+            self.write([_recombinantLine(0, breakpoints)])
+            self.assertSameOutcome()
+
+    def testUnusualLines(self):
+        """
+        Unusual lines must be read (or rejected) exactly as by the
+        line-by-line parser.
+        """
+        line = _recombinantLine(1)
+        for lines in ([''], [line, ''], [line.replace('\t', ' ', 3)],
+                      [line.replace('\t1\t', '\t3\t')],
+                      [line.replace('1.5e-7', 'inf')],
+                      [line.replace('\t2\t', '\t 2 \t')],
+                      [line.replace('\t2\t', '\t2.0\t')]):
+            self.write(lines)
+            self.assertSameOutcome()
+
+
+class TestParseBreakpointsBlock(TestCase):
+    """
+    Tests for the C{py3seq.analysis._parseBreakpointsBlock} function.
+    """
+    def testBreakpoints(self):
+        """
+        Canonical breakpoints must be decoded into counts and indices.
+        """
+        counts, values = _parseBreakpointsBlock(
+            (' 1-3 &  4-6\t10-12 & 50-62\n', '  7-7   & 8-9 '))
+        self.assertEqual([2, 1], counts)
+        self.assertEqual([1, 3, 4, 6, 10, 12, 50, 62, 7, 7, 8, 9],
+                         values.tolist())
+
+    def testNoBreakpoints(self):
+        """
+        If a line has no breakpoints, C{None} must be returned.
+        """
+        self.assertIsNone(_parseBreakpointsBlock(('1-3 & 4-6\n', ' \t\n')))
+
+    def testDescending(self):
+        """
+        If breakpoint indices are descending, C{None} must be returned.
+        """
+        self.assertIsNone(
+            _parseBreakpointsBlock(('1-3 & 4-6\t9-8 & 10-11\n',)))
+
+    def testSpaceInIndex(self):
+        """
+        If an index has a space in it (even if another index is empty, so
+        that the number of indices is as expected), C{None} must be
+        returned.
+        """
+        self.assertIsNone(_parseBreakpointsBlock(('1-2 & 3 4-\n',)))
+
+    def testLargeIndex(self):
+        """
+        If an index is too large for a 32-bit integer, C{None} must be
+        returned.
+        """
+        self.assertIsNone(
+            _parseBreakpointsBlock(('1-2 & 3-99999999999999999999\n',)))
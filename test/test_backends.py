@@ -0,0 +1,264 @@
+from unittest import TestCase
+from six import assertRaisesRegex
+from os import listdir
+from os.path import dirname
+from subprocess import CalledProcessError
+from tempfile import mkdtemp
+from threading import Timer
+from time import time
+import shutil
+
+from py3seq import RecombinationAnalysis
+from py3seq.backends import (
+    JobArrayBackend, LocalJobArrayScheduler, PoolBackend, SerialBackend)
+
+
+class TestSerialBackend(TestCase):
+    """
+    Tests for the C{py3seq.backends.SerialBackend} class.
+    """
+    def testExecute(self):
+        """
+        The execute method must return a C{CompletedProcess} with the
+        expected standard output.
+        """
+        result = SerialBackend().execute('echo hello')
+        self.assertEqual(0, result.returncode)
+        self.assertEqual('hello\n', result.stdout)
+
+    def testMap(self):
+        """
+        The map method must return results in the order of the commands.
+        """
+        results = SerialBackend().map(['echo a', 'echo b'])
+        self.assertEqual(['a\n', 'b\n'], [r.stdout for r in results])
+
+    def testDryRun(self):
+        """
+        In a dry run, commands must be logged but not executed.
+        """
+        backend = SerialBackend(dryRun=True)
+        self.assertEqual([None], backend.map(['echo hello']))
+        self.assertEqual('$ echo hello', backend.executor.log[-1])
+
+
+class TestPoolBackend(TestCase):
+    """
+    Tests for the C{py3seq.backends.PoolBackend} class.
+    """
+    def testMap(self):
+        """
+        The map method must return results in the order of the commands.
+        """
+        commands = ['sleep 0.%d; echo %d' % (5 - i, i) for i in range(5)]
+        results = PoolBackend(processes=5).map(commands)
+        self.assertEqual(['%d\n' % i for i in range(5)],
+                         [r.stdout for r in results])
+
+    def testFailure(self):
+        """
+        If a command fails, map must raise a C{CalledProcessError}.
+        """
+        self.assertRaises(CalledProcessError, PoolBackend(processes=2).map,
+                          ['true', 'exit 3'])
+
+
+class TestJobArrayBackend(TestCase):
+    """
+    Tests for the C{py3seq.backends.JobArrayBackend} class.
+    """
+    def setUp(self):
+        self.sharedDir = mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.sharedDir)
+
+    def testMap(self):
+        """
+        When run by a local scheduler, map must return results in the order
+        of the commands and remove its job directory.
+        """
+        backend = JobArrayBackend(self.sharedDir, LocalJobArrayScheduler(),
+                                  pollInterval=0.01)
+        results = backend.map(['echo a', 'echo b >&2', 'echo c'])
+        self.assertEqual(['a\n', '', 'c\n'], [r.stdout for r in results])
+        self.assertEqual(['', 'b\n', ''], [r.stderr for r in results])
+        self.assertEqual([], listdir(self.sharedDir))
+
+    def testFirstTaskId(self):
+        """
+        Task ids that start from 1 (as in SGE) must be handled.
+        """
+        backend = JobArrayBackend(
+            self.sharedDir, LocalJobArrayScheduler('SGE_TASK_ID'),
+            taskIdVariable='SGE_TASK_ID', firstTaskId=1, pollInterval=0.01)
+        results = backend.map(['echo a', 'echo b'])
+        self.assertEqual(['a\n', 'b\n'], [r.stdout for r in results])
+
+    def testSubmitCommand(self):
+        """
+        A string submit command must be formatted and executed.
+        """
+        backend = JobArrayBackend(
+            self.sharedDir, 'SLURM_ARRAY_TASK_ID=%(first)d sh %(script)s',
+            pollInterval=0.01)
+        (result,) = backend.map(['echo hello'])
+        self.assertEqual('hello\n', result.stdout)
+
+    def testFailure(self):
+        """
+        If a task fails, map must raise a C{CalledProcessError} with the
+        task's exit status.
+        """
+        backend = JobArrayBackend(self.sharedDir, LocalJobArrayScheduler(),
+                                  pollInterval=0.01)
+        error = "returned non-zero exit status 3"
+        assertRaisesRegex(self, CalledProcessError, error, backend.map,
+                          ['true', 'exit 3'])
+
+    def testTimeout(self):
+        """
+        If tasks do not finish in time, map must raise a C{RuntimeError}.
+        """
+        backend = JobArrayBackend(self.sharedDir, lambda script, ids: None,
+                                  pollInterval=0.01, timeout=0.05)
+        error = '^Timed out after 0.1 seconds waiting for 2 job array tasks '
+        assertRaisesRegex(self, RuntimeError, error, backend.map,
+                          ['true', 'true'])
+
+    def testLostTask(self):
+        """
+        If submit waits for the tasks to finish and a task writes no exit
+        status (e.g., because the scheduler killed it), map must raise a
+        C{RuntimeError} without waiting for the timeout.
+        """
+        scheduler = LocalJobArrayScheduler()
+
+        def submit(script, taskIds):
+            scheduler(script, taskIds[:1])
+
+        submit.waits = True
+        backend = JobArrayBackend(self.sharedDir, submit, pollInterval=0.01,
+                                  lostTaskGrace=0.2)
+        error = (r'^Job array task 1 in .* finished without writing its exit '
+                 r'status \(was it killed by the scheduler\?\)$')
+        start = time()
+        assertRaisesRegex(self, RuntimeError, error, backend.map,
+                          ['true', 'true'])
+        self.assertGreaterEqual(time() - start, 0.2)
+        self.assertLess(time() - start, 5)
+
+    def testLateStatus(self):
+        """
+        If submit waits for the tasks to finish, an exit status that only
+        becomes visible after it returns (e.g., on NFS) must be waited for.
+        """
+        scheduler = LocalJobArrayScheduler()
+
+        def submit(script, taskIds):
+            scheduler(script, taskIds[:1])
+            Timer(0.2, scheduler, (script, taskIds[1:])).start()
+
+        submit.waits = True
+        backend = JobArrayBackend(self.sharedDir, submit, pollInterval=0.01,
+                                  lostTaskGrace=10)
+        results = backend.map(['echo 1', 'echo 2'])
+        self.assertEqual(['1\n', '2\n'],
+                         [result.stdout for result in results])
+
+    def testSubmitFails(self):
+        """
+        If submitting the job array fails, the job directory must be
+        removed.
+        """
+        def submit(script, taskIds):
+            raise RuntimeError('sbatch: error: Batch job submission failed')
+
+        backend = JobArrayBackend(self.sharedDir, submit, pollInterval=0.01)
+        error = '^sbatch: error: Batch job submission failed$'
+        assertRaisesRegex(self, RuntimeError, error, backend.map, ['true'])
+        self.assertEqual([], listdir(self.sharedDir))
+
+    def testSubmitWaits(self):
+        """
+        Whether submit waits for the tasks to finish must be recognized.
+        """
+        for submit, waits in (
+                (LocalJobArrayScheduler(), True),
+                (lambda script, ids: None, False),
+                ('sbatch --wait --array=%(first)d-%(last)d %(script)s', True),
+                ('qsub -sync y -t %(first)d-%(last)d %(script)s', True),
+                ('sbatch --array=%(first)d-%(last)d %(script)s', False)):
+            self.assertEqual(
+                waits, JobArrayBackend(self.sharedDir, submit).submitWaits)
+        self.assertFalse(JobArrayBackend(
+            self.sharedDir, LocalJobArrayScheduler(),
+            submitWaits=False).submitWaits)
+
+    def testDefaultTimeout(self):
+        """
+        By default, map must not wait indefinitely.
+        """
+        backend = JobArrayBackend(self.sharedDir, LocalJobArrayScheduler())
+        self.assertEqual(7 * 24 * 60 * 60, backend.timeout)
+
+    def testDryRun(self):
+        """
+        In a dry run, the submission command must be logged but not run.
+        """
+        backend = JobArrayBackend(
+            self.sharedDir, 'sbatch --array=%(first)d-%(last)d %(script)s',
+            dryRun=True)
+        self.assertEqual([None, None], backend.map(['true', 'true']))
+        self.assertTrue(backend.executor.log[-1].startswith(
+            '$ sbatch --array=0-1 '))
+
+
+class TestRecombinationAnalysisBackend(TestCase):
+    """
+    Tests for the use of backends by C{py3seq.RecombinationAnalysis}.
+    """
+    def testDefaultBackend(self):
+        """
+        If no backend is given, a serial backend must be used and its
+        executor must be that of the analysis.
+        """
+        ra = RecombinationAnalysis('table', dryRun=True)
+        self.assertIsInstance(ra.backend, SerialBackend)
+        self.assertIs(ra.backend.executor, ra.executor)
+        self.assertTrue(ra.executor.dryRun)
+
+    def testRunUsesBackend(self):
+        """
+        The run method must execute its 3seq command via the backend.
+        """
+        ra = RecombinationAnalysis('table',
+                                   backend=PoolBackend(dryRun=True))
+        ra.run('input.fasta', validate=False)
+        ra.removeOutput()
+        self.assertTrue(ra.executor.log[-1].startswith(
+            '$ echo y | 3seq -full "input.fasta" -ptable "table"'))
+
+    def testScratchRootFromJobArrayBackend(self):
+        """
+        With a job array backend, the output directory must be made in the
+        backend's shared directory, unless a scratch root is given.
+        """
+        sharedDir = mkdtemp()
+        scratchRoot = mkdtemp()
+        try:
+            backend = JobArrayBackend(sharedDir, 'sbatch %(script)s',
+                                      dryRun=True)
+            ra = RecombinationAnalysis('table', backend=backend)
+            ra.run('input.fasta', validate=False)
+            self.assertEqual(sharedDir, dirname(ra.tmpDir))
+            ra.removeOutput()
+
+            ra = RecombinationAnalysis('table', backend=backend,
+                                       scratchRoot=scratchRoot)
+            ra.run('input.fasta', validate=False)
+            self.assertEqual(scratchRoot, dirname(ra.tmpDir))
+            ra.removeOutput()
+        finally:
+            shutil.rmtree(sharedDir)
+            shutil.rmtree(scratchRoot)
@@ -0,0 +1,249 @@
+from unittest import TestCase, skipIf
+from six import assertRaisesRegex
+from six.moves import builtins
+from os.path import join
+from tempfile import mkdtemp
+import shutil
+
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+try:
+    import pandas as pd
+    from pandas.api.types import union_categoricals
+except ImportError:
+    pd = None
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+import numpy as np
+
+from .mocking import mockOpen
+
+from py3seq.analysis import _RECOMBINANTS_HEADER
+from py3seq.frame import (
+    iterRecombinantFrames, readRecombinantsFrame, writeRecombinantsParquet)
+
+_DATA = '\n'.join((
+    _RECOMBINANTS_HEADER,
+    'id1 id2 id3 0 1 6 1.0 1 3.0 5.0 4.0 6 '.replace(' ', '\t') +
+    ' 1-3 &  4-6\t10-12 & 50-62',
+    'id4 id5 id6 1 2 7 1e-60 0 -60.0 6.0 1e-58 7 '.replace(' ', '\t') +
+    ' 2-4 &  5-7',
+    'id3 id1 id4 3 4 8 0.5 0 -0.3 6.0 0.75 8 '.replace(' ', '\t') +
+    ' 3-5 &  6-8',
+)) + '\n'
+
+
+@skipIf(pd is None, 'pandas is not installed')
+class TestReadRecombinantsFrame(TestCase):
+    """
+    Tests for the C{py3seq.frame.readRecombinantsFrame} function.
+    """
+    def testUnrecognizedHeader(self):
+        """
+        If an unrecognized header line is passed, a ValueError must be
+        raised.
+        """
+        mockOpener = mockOpen(read_data='bad header\n')
+        with patch.object(builtins, 'open', mockOpener):
+            error = '^Unrecognized header line: bad header$'
+            assertRaisesRegex(self, ValueError, error, readRecombinantsFrame,
+                              'filename')
+
+    def testBadLine(self):
+        """
+        If a line is invalid, the error of C{readRecombinants} must be
+        raised.
+        """
+        mockOpener = mockOpen(read_data='\n'.join((
+            _RECOMBINANTS_HEADER,
+            'id1 id2 id3 six 0 0 1.0 1 3.0 4.0 4.0 5 ...'.replace(' ', '\t'),
+        )) + '\n')
+        with patch.object(builtins, 'open', mockOpener):
+            error = r"^invalid literal for int\(\) with base 10: 'six'$"
+            assertRaisesRegex(self, ValueError, error, readRecombinantsFrame,
+                              'filename')
+
+    def testNoRecombinants(self):
+        """
+        If the file has only a header, empty frames with the expected
+        columns must be returned.
+        """
+        mockOpener = mockOpen(read_data='%s\n' % _RECOMBINANTS_HEADER)
+        with patch.object(builtins, 'open', mockOpener):
+            recombinants, breakpoints = readRecombinantsFrame('filename')
+        self.assertEqual(0, len(recombinants))
+        self.assertEqual(0, len(breakpoints))
+        self.assertEqual(
+            ['pId', 'qId', 'recombinantId', 'm', 'n', 'k', 'p', 'hs', 'logp',
+             'dsP', 'minRecLength'],
+            list(recombinants.columns))
+        self.assertEqual(['row', 'left1', 'left2', 'right1', 'right2'],
+                         list(breakpoints.columns))
+
+    def testValues(self):
+        """
+        The frames must contain the expected values.
+        """
+        mockOpener = mockOpen(read_data=_DATA)
+        with patch.object(builtins, 'open', mockOpener):
+            recombinants, breakpoints = readRecombinantsFrame(
+                'filename', chunksize=2)
+
+        self.assertEqual(['id1', 'id4', 'id3'], list(recombinants.pId))
+        self.assertEqual(['id2', 'id5', 'id1'], list(recombinants.qId))
+        self.assertEqual(['id3', 'id6', 'id4'],
+                         list(recombinants.recombinantId))
+        self.assertEqual([0, 1, 3], list(recombinants.m))
+        self.assertEqual([True, False, False], list(recombinants.hs))
+        self.assertEqual([1.0, 1e-60, 0.5], list(recombinants.p))
+        self.assertEqual([4.0, 1e-58, 0.75], list(recombinants.dsP))
+        self.assertEqual([6, 7, 8], list(recombinants.minRecLength))
+        self.assertEqual([0, 1, 2], list(recombinants.index))
+
+        self.assertEqual([0, 0, 1, 2], list(breakpoints.row))
+        self.assertEqual([1, 10, 2, 3], list(breakpoints.left1))
+        self.assertEqual([3, 12, 4, 5], list(breakpoints.left2))
+        self.assertEqual([4, 50, 5, 6], list(breakpoints.right1))
+        self.assertEqual([6, 62, 7, 8], list(breakpoints.right2))
+
+    def testDtypes(self):
+        """
+        The frame columns must have the expected (downcast) types.
+        """
+        mockOpener = mockOpen(read_data=_DATA)
+        with patch.object(builtins, 'open', mockOpener):
+            recombinants, breakpoints = readRecombinantsFrame('filename')
+
+        for name in 'pId', 'qId', 'recombinantId':
+            self.assertEqual('category', recombinants[name].dtype.name)
+        # The three id columns must share their categories.
+        self.assertEqual(list(recombinants.pId.cat.categories),
+                         list(recombinants.recombinantId.cat.categories))
+        for name in 'm', 'n', 'k', 'minRecLength':
+            self.assertEqual(np.int32, recombinants[name].dtype)
+        self.assertEqual(np.float64, recombinants.p.dtype)
+        self.assertEqual(np.float64, recombinants.dsP.dtype)
+        self.assertEqual(np.float32, recombinants.logp.dtype)
+        self.assertEqual(np.bool_, recombinants.hs.dtype)
+        for name in breakpoints.columns:
+            self.assertEqual(np.int32, breakpoints[name].dtype)
+
+
+@skipIf(pd is None, 'pandas is not installed')
+class TestIterRecombinantFrames(TestCase):
+    """
+    Tests for the C{py3seq.frame.iterRecombinantFrames} function.
+    """
+    def testBadChunksize(self):
+        """
+        A chunk size of less than 1 must result in a ValueError.
+        """
+        mockOpener = mockOpen(read_data=_DATA)
+        with patch.object(builtins, 'open', mockOpener):
+            error = '^Chunk size must be at least 1$'
+            assertRaisesRegex(self, ValueError, error, list,
+                              iterRecombinantFrames('filename', 0))
+
+    def testChunks(self):
+        """
+        The frames must be yielded in chunks of the requested size, with
+        recombinant row numbers continuing across chunks.
+        """
+        mockOpener = mockOpen(read_data=_DATA)
+        with patch.object(builtins, 'open', mockOpener):
+            chunks = list(iterRecombinantFrames('filename', chunksize=2))
+
+        self.assertEqual(2, len(chunks))
+        (recombinants1, breakpoints1), (recombinants2, breakpoints2) = chunks
+        self.assertEqual([0, 1], list(recombinants1.index))
+        self.assertEqual([2], list(recombinants2.index))
+        self.assertEqual([0, 0, 1], list(breakpoints1.row))
+        self.assertEqual([2], list(breakpoints2.row))
+        self.assertEqual(['id3'], list(recombinants2.pId))
+
+    def testCombineChunkCategories(self):
+        """
+        The id categories of each chunk must be a prefix of those of the next
+        so that union_categoricals can combine chunks without changing the
+        id codes.
+        """
+        mockOpener = mockOpen(read_data=_DATA)
+        with patch.object(builtins, 'open', mockOpener):
+            chunks = list(iterRecombinantFrames('filename', chunksize=1))
+
+        (recombinants1, _), (recombinants2, _) = chunks[:2]
+        categories1 = list(recombinants1.pId.cat.categories)
+        categories2 = list(recombinants2.pId.cat.categories)
+        self.assertEqual(categories1, categories2[:len(categories1)])
+        self.assertNotEqual(categories1, categories2)
+
+        pIds = union_categoricals([recombinants.pId
+                                   for recombinants, _ in chunks])
+        self.assertEqual(categories2, list(pIds.categories))
+        self.assertEqual(['id1', 'id4', 'id3'], list(pIds))
+        self.assertEqual('category', str(pIds.dtype))
+
+    def testChunksStraddlingBlocks(self):
+        """
+        Chunks whose size is not a multiple of the number of lines decoded
+        at once must have the requested size and hold the expected rows.
+        """
+        lines = _DATA.split('\n')[1:-1]
+        mockOpener = mockOpen(read_data='\n'.join(
+            [_RECOMBINANTS_HEADER] + lines * 100) + '\n')
+        with patch.object(builtins, 'open', mockOpener):
+            chunks = list(iterRecombinantFrames('filename', chunksize=70))
+
+        self.assertEqual([70, 70, 70, 70, 20],
+                         [len(recombinants) for recombinants, _ in chunks])
+        recombinants = pd.concat([recombinants for recombinants, _ in chunks])
+        breakpoints = pd.concat([breakpoints for _, breakpoints in chunks])
+        self.assertEqual(list(range(300)), list(recombinants.index))
+        self.assertEqual(['id1', 'id4', 'id3'] * 100,
+                         list(recombinants.pId.astype(str)))
+        self.assertEqual([0, 0, 1, 2, 3, 3, 4, 5],
+                         list(breakpoints.row[:8]))
+        self.assertEqual(400, len(breakpoints))
+
+
+@skipIf(pq is None, 'pyarrow is not installed')
+class TestWriteRecombinantsParquet(TestCase):
+    """
+    Tests for the C{py3seq.frame.writeRecombinantsParquet} function.
+    """
+    def setUp(self):
+        self.tmpDir = mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def testValues(self):
+        """
+        The Parquet files must contain the expected values.
+        """
+        recFile = join(self.tmpDir, 'output.3s.rec')
+        recombinantsFile = join(self.tmpDir, 'recombinants.parquet')
+        breakpointsFile = join(self.tmpDir, 'breakpoints.parquet')
+        with open(recFile, 'w') as fp:
+            fp.write(_DATA)
+
+        writeRecombinantsParquet(recFile, recombinantsFile, breakpointsFile,
+                                 chunksize=2)
+
+        recombinants = pq.read_table(recombinantsFile).to_pydict()
+        self.assertEqual([0, 1, 2], recombinants['row'])
+        self.assertEqual(['id1', 'id4', 'id3'], recombinants['pId'])
+        self.assertEqual(['id3', 'id6', 'id4'],
+                         recombinants['recombinantId'])
+        self.assertEqual([1.0, 1e-60, 0.5], recombinants['p'])
+
+        breakpoints = pq.read_table(breakpointsFile).to_pydict()
+        self.assertEqual([0, 0, 1, 2], breakpoints['row'])
+        self.assertEqual([6, 62, 7, 8], breakpoints['right2'])
@@ -0,0 +1,464 @@
+from unittest import TestCase
+from six import assertRaisesRegex
+from os import listdir, nice
+from os.path import dirname, exists, join
+from subprocess import CalledProcessError
+from tempfile import mkdtemp
+from threading import Thread, Timer
+from time import sleep, time
+import shutil
+import signal
+import sys
+
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+from py3seq import RecombinationAnalysis
+from py3seq.backends import (
+    JobArrayBackend, LocalJobArrayScheduler, PoolBackend, SerialBackend)
+from py3seq.limits import (
+    Canceller, CPUTimeLimitError, MemoryLimitError, ResourceLimits,
+    RunCancelledError, TimeoutLimitError, limitError, runLimited)
+
+_PYTHON = '"%s" -c' % sys.executable
+
+
+def _running(pid):
+    """
+    Find out whether a process is running (i.e., exists and is not a
+    zombie).
+
+    @param pid: The C{int} process id.
+    @return: C{True} if the process is running, else C{False}.
+    """
+    try:
+        with open('/proc/%d/stat' % pid) as fp:
+            # The state follows the command name, which is in parentheses.
+            return fp.read().rsplit(')', 1)[1].split()[0] != 'Z'
+    except IOError:
+        return False
+
+
+class TestRunLimited(TestCase):
+    """
+    Tests for the C{py3seq.limits.runLimited} function.
+    """
+    def testSuccess(self):
+        """
+        A successful command must return its output and be logged.
+        """
+        log = []
+        result = runLimited('echo hello', log)
+        self.assertEqual('hello\n', result.stdout)
+        self.assertEqual('$ echo hello', log[1])
+        self.assertTrue(log[-1].startswith('# Elapsed = '))
+
+    def testFailure(self):
+        """
+        A failing command that hits no limit must raise a
+        C{CalledProcessError}.
+        """
+        self.assertRaises(CalledProcessError, runLimited, 'exit 3', [],
+                          ResourceLimits(timeout=10))
+
+    def testTimeout(self):
+        """
+        A command that takes too long must be killed and a
+        C{TimeoutLimitError} raised.
+        """
+        start = time()
+        error = r'^Command exceeded its timeout limit \(0.2\): sleep 10$'
+        assertRaisesRegex(self, TimeoutLimitError, error, runLimited,
+                          'sleep 10', [], ResourceLimits(timeout=0.2))
+        self.assertLess(time() - start, 5)
+
+    def testCPUTime(self):
+        """
+        A command that uses too much CPU time must raise a
+        C{CPUTimeLimitError}.
+        """
+        try:
+            runLimited('while :; do :; done', [],
+                       ResourceLimits(cpuTime=1, timeout=30))
+        except CPUTimeLimitError as e:
+            self.assertEqual('cpuTime', e.limit)
+            self.assertEqual(1, e.value)
+        else:
+            self.fail('CPUTimeLimitError not raised')
+
+    def testKilledWithCPUTimeLimit(self):
+        """
+        A command killed (here, by itself) before using its CPU time must
+        raise a C{CalledProcessError}, not a C{CPUTimeLimitError}.
+        """
+        try:
+            runLimited('kill -9 $$', [], ResourceLimits(cpuTime=5))
+        except CalledProcessError as e:
+            self.assertEqual(-9, e.returncode)
+        else:
+            self.fail('CalledProcessError not raised')
+
+    def testMemory(self):
+        """
+        A command that tries to use too much memory must raise a
+        C{MemoryLimitError}.
+        """
+        limit = 500 * 1024 * 1024
+        error = r'^Command exceeded its memory limit \(%d\): ' % limit
+        assertRaisesRegex(
+            self, MemoryLimitError, error, runLimited,
+            '%s "x = bytearray(10 ** 10)"' % _PYTHON, [],
+            ResourceLimits(memory=limit))
+
+    def testCPUTimeSoftAndHard(self):
+        """
+        The soft CPU time limit of a command must be as given, and its hard
+        limit one second more.
+        """
+        result = runLimited('ulimit -S -t; ulimit -H -t', [],
+                            ResourceLimits(cpuTime=3))
+        self.assertEqual('3\n4\n', result.stdout)
+
+    def testCommandQuoted(self):
+        """
+        A command with limits must be run unchanged, whatever quotes and
+        shell syntax it contains.
+        """
+        result = runLimited(
+            "echo \"it's\" && echo '$HOME' | tr a-z A-Z", [],
+            ResourceLimits(memory=500 * 1024 * 1024, nice=1))
+        self.assertEqual("it's\n$HOME\n", result.stdout)
+
+    def testCPUs(self):
+        """
+        The CPU affinity of a command must be set.
+        """
+        result = runLimited(
+            '%s "import os; print(sorted(os.sched_getaffinity(0)))"' %
+            _PYTHON, [], ResourceLimits(cpus=[0]))
+        self.assertEqual('[0]\n', result.stdout)
+
+    def testNice(self):
+        """
+        The nice level of a command must be increased.
+        """
+        result = runLimited('%s "import os; print(os.nice(0))"' % _PYTHON,
+                            [], ResourceLimits(nice=5))
+        self.assertEqual(min(19, nice(0) + 5), int(result.stdout))
+
+    def testCancel(self):
+        """
+        A cancelled command must have its process group killed and a
+        C{RunCancelledError} raised.
+        """
+        canceller = Canceller()
+        Timer(0.2, canceller.cancel).start()
+        start = time()
+        error = r'^Command cancelled: sleep 10 & sleep 10; wait$'
+        assertRaisesRegex(self, RunCancelledError, error, runLimited,
+                          'sleep 10 & sleep 10; wait', [],
+                          canceller=canceller)
+        self.assertLess(time() - start, 5)
+
+    def testInterrupted(self):
+        """
+        If waiting for a command is interrupted (e.g., by a
+        C{KeyboardInterrupt}), its process group must be killed.
+        """
+        def interrupt(signalNumber, frame):
+            raise KeyboardInterrupt()
+
+        pidFile = join(mkdtemp(), 'pid')
+        previous = signal.signal(signal.SIGALRM, interrupt)
+        try:
+            signal.setitimer(signal.ITIMER_REAL, 0.5)
+            self.assertRaises(KeyboardInterrupt, runLimited,
+                              'sleep 37 & echo $! > "%s"; wait' % pidFile,
+                              [])
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+
+        with open(pidFile) as fp:
+            pid = int(fp.read())
+        shutil.rmtree(dirname(pidFile))
+
+        # The killed sleep may briefly be a zombie, until it is reaped by
+        # the process it was reparented to.
+        start = time()
+        while _running(pid) and time() - start < 5:
+            sleep(0.01)
+        self.assertFalse(_running(pid))
+
+    def testCancelBeforeStart(self):
+        """
+        A command started after a cancellation (and before a reset) must be
+        killed immediately.
+        """
+        canceller = Canceller()
+        canceller.cancel()
+        self.assertRaises(RunCancelledError, runLimited, 'sleep 10', [],
+                          canceller=canceller)
+        canceller.reset()
+        self.assertEqual(0, runLimited('true', [],
+                                       canceller=canceller).returncode)
+
+
+class TestShellCommand(TestCase):
+    """
+    Tests for the C{py3seq.limits.ResourceLimits.shellCommand} method.
+    """
+    def testNoLimits(self):
+        """
+        If there are no limits to set, the command must be returned
+        unchanged.
+        """
+        self.assertEqual('echo hello',
+                         ResourceLimits(timeout=10).shellCommand('echo hello'))
+
+    def testLimits(self):
+        """
+        The limits must be set by the shell before the command is run.
+        """
+        self.assertEqual(
+            "ulimit -S -t 10 && ulimit -H -t 11 && ulimit -v 2048 && "
+            "exec nice -n 5 taskset -c 0,3 sh -c 'echo hello'",
+            ResourceLimits(cpuTime=10, memory=2 * 1024 * 1024, cpus=[3, 0],
+                           nice=5).shellCommand('echo hello'))
+
+
+class TestLimitError(TestCase):
+    """
+    Tests for the C{py3seq.limits.limitError} function.
+    """
+    def testNoLimits(self):
+        """
+        If there are no limits, C{None} must be returned.
+        """
+        self.assertIsNone(limitError(None, 'cmd', 137, '', ''))
+
+    def testCPUSignalFromShell(self):
+        """
+        A shell exit status showing its command got SIGXCPU must give a
+        C{CPUTimeLimitError} if there is a CPU time limit.
+        """
+        self.assertIsInstance(
+            limitError(ResourceLimits(cpuTime=10), 'cmd', 128 + 24, '', ''),
+            CPUTimeLimitError)
+
+    def testKillAfterCPUTime(self):
+        """
+        A SIGKILL must give a C{CPUTimeLimitError} if the command used (at
+        least) its CPU time limit.
+        """
+        self.assertIsInstance(
+            limitError(ResourceLimits(cpuTime=10), 'cmd', -9, '', '',
+                       cpuTime=11.01),
+            CPUTimeLimitError)
+
+    def testKillBeforeCPUTime(self):
+        """
+        A SIGKILL must not be attributed to the CPU time limit if the command
+        used less CPU time than that, or if its CPU time is not known.
+        """
+        limits = ResourceLimits(cpuTime=10)
+        self.assertIsNone(limitError(limits, 'cmd', -9, '', '', cpuTime=0.5))
+        self.assertIsNone(limitError(limits, 'cmd', 137, '', ''))
+
+    def testSignalsNotMemory(self):
+        """
+        An abort, a segmentation fault, or a SIGKILL must not be attributed
+        to the memory limit.
+        """
+        limits = ResourceLimits(memory=10)
+        for returncode in -6, -11, -9, 128 + 6:
+            self.assertIsNone(limitError(limits, 'cmd', returncode, '', ''))
+
+    def testMemoryWordNotMemory(self):
+        """
+        A failure whose error output merely mentions memory must not be
+        attributed to the memory limit.
+        """
+        self.assertIsNone(limitError(
+            ResourceLimits(memory=10), 'cmd', 1, '',
+            'Error: shared memory segment not found'))
+
+    def testCannotAllocate(self):
+        """
+        A C{Cannot allocate memory} error must give a C{MemoryLimitError} if
+        there is a memory limit.
+        """
+        self.assertIsInstance(
+            limitError(ResourceLimits(memory=10), 'cmd', 1, '',
+                       'sh: 1: Cannot fork: Cannot allocate memory'),
+            MemoryLimitError)
+
+    def testBadAlloc(self):
+        """
+        A C++ bad_alloc message must give a C{MemoryLimitError} if there is
+        a memory limit.
+        """
+        self.assertIsInstance(
+            limitError(ResourceLimits(memory=10), 'cmd', 1, '',
+                       "terminate called after throwing an instance of "
+                       "'std::bad_alloc'"),
+            MemoryLimitError)
+
+    def testOrdinaryFailure(self):
+        """
+        An ordinary failure must not be attributed to a limit.
+        """
+        self.assertIsNone(limitError(
+            ResourceLimits(memory=10, cpuTime=10), 'cmd', 1, '', 'oops'))
+
+
+class TestBackendLimits(TestCase):
+    """
+    Tests for resource limits and cancellation in backends.
+    """
+    def testSerialTimeout(self):
+        """
+        A serial backend must apply a timeout.
+        """
+        self.assertRaises(TimeoutLimitError, SerialBackend().execute,
+                          'sleep 10', limits=ResourceLimits(timeout=0.2))
+
+    def testPoolCancel(self):
+        """
+        Cancelling a pool backend must kill all its running commands.
+        """
+        backend = PoolBackend(processes=3)
+        Timer(0.2, backend.cancel).start()
+        start = time()
+        self.assertRaises(RunCancelledError, backend.map,
+                          ['sleep 10', 'sleep 10', 'sleep 10'])
+        self.assertLess(time() - start, 5)
+
+    def testJobArrayLimits(self):
+        """
+        A job array backend must apply limits in its task scripts.
+        """
+        sharedDir = mkdtemp()
+        try:
+            backend = JobArrayBackend(sharedDir, LocalJobArrayScheduler(),
+                                      pollInterval=0.01)
+            self.assertRaises(TimeoutLimitError, backend.map, ['sleep 10'],
+                              limits=ResourceLimits(timeout=0.2))
+            self.assertRaises(CPUTimeLimitError, backend.map,
+                              ['while :; do :; done'],
+                              limits=ResourceLimits(cpuTime=1, timeout=30))
+            (result,) = backend.map(
+                ['%s "import os; print(os.nice(0))"' % _PYTHON],
+                limits=ResourceLimits(nice=5))
+            self.assertEqual(min(19, nice(0) + 5), int(result.stdout))
+        finally:
+            shutil.rmtree(sharedDir)
+
+    def testJobArrayKillNotCPUTime(self):
+        """
+        A job array task killed before using its CPU time must raise a
+        C{CalledProcessError}, not a C{CPUTimeLimitError} or a
+        C{TimeoutLimitError}.
+        """
+        sharedDir = mkdtemp()
+        try:
+            backend = JobArrayBackend(sharedDir, LocalJobArrayScheduler(),
+                                      pollInterval=0.01)
+            try:
+                backend.map(['kill -9 $$'],
+                            limits=ResourceLimits(cpuTime=5, timeout=30))
+            except CalledProcessError as e:
+                self.assertEqual(137, e.returncode)
+            else:
+                self.fail('CalledProcessError not raised')
+        finally:
+            shutil.rmtree(sharedDir)
+
+
+class TestRecombinationAnalysisCancel(TestCase):
+    """
+    Tests for C{py3seq.RecombinationAnalysis.cancel}.
+    """
+    def testCancel(self):
+        """
+        Cancelling a run must make it raise a C{RunCancelledError} and must
+        remove its output directory.
+        """
+        ra = RecombinationAnalysis('table')
+        errors = []
+
+        def run():
+            try:
+                ra.run('input.fasta', validate=False)
+            except RunCancelledError as e:
+                errors.append(e)
+
+        with patch.object(ra, '_command', return_value='sleep 10'):
+            thread = Thread(target=run)
+            thread.start()
+            while ra.tmpDir is None:
+                pass
+            tmpDir = ra.tmpDir
+            timer = Timer(0.2, ra.cancel)
+            timer.start()
+            thread.join(5)
+            timer.join()
+
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(1, len(errors))
+        self.assertFalse(exists(tmpDir))
+        self.assertIsNone(ra.tmpDir)
+
+    def testCancelDuringSetup(self):
+        """
+        A cancellation made while a run is being set up (here, while its
+        input is validated) must not be lost: the command must not be
+        started, a C{RunCancelledError} must be raised and no output
+        directory must be left.
+        """
+        root = mkdtemp()
+        try:
+            ra = RecombinationAnalysis('table', scratchRoot=root)
+            with patch('py3seq.analysis.validateAlignment',
+                       side_effect=lambda reads: ra.cancel()):
+                with patch.object(ra.backend, 'execute') as executeMock:
+                    self.assertRaises(RunCancelledError, ra.run,
+                                      'input.fasta')
+            self.assertFalse(executeMock.called)
+            self.assertIsNone(ra.tmpDir)
+            self.assertEqual([], listdir(root))
+        finally:
+            shutil.rmtree(root)
+
+    def testCancelBeforeJobArraySubmit(self):
+        """
+        A job array must not be submitted if its backend has been cancelled
+        since the start of the run.
+        """
+        sharedDir = mkdtemp()
+        try:
+            backend = JobArrayBackend(sharedDir, LocalJobArrayScheduler(),
+                                      pollInterval=0.01)
+            backend.cancel()
+            with patch.object(backend, 'submit') as submitMock:
+                self.assertRaises(RunCancelledError, backend.map, ['true'])
+            self.assertFalse(submitMock.called)
+            self.assertEqual([], listdir(sharedDir))
+            backend.reset()
+            (result,) = backend.map(['true'])
+            self.assertEqual(0, result.returncode)
+        finally:
+            shutil.rmtree(sharedDir)
+
+    def testRunPassesLimits(self):
+        """
+        The run method must pass its limits to the backend.
+        """
+        ra = RecombinationAnalysis('table')
+        limits = ResourceLimits(timeout=10)
+        with patch.object(ra.backend, 'execute') as executeMock:
+            ra.run('input.fasta', validate=False, limits=limits)
+        ra.removeOutput()
+        self.assertIs(limits, executeMock.call_args[1]['limits'])
@@ -0,0 +1,215 @@
+from unittest import TestCase
+from six import assertRaisesRegex
+from os.path import join
+from tempfile import mkdtemp
+import shutil
+
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+from py3seq import RecombinationAnalysis
+from py3seq.analysis import _OUTPUT_PREFIX, _RECOMBINANTS_HEADER
+from py3seq.results import (
+    ThreeSeqResults, readLog, readLongRecombinants, readPValueHistogram)
+
+
+class _TmpDirTestCase(TestCase):
+    """
+    A test case with a temporary directory to write files to.
+    """
+    def setUp(self):
+        self.tmpDir = mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def write(self, name, data):
+        """
+        Write data to a file.
+
+        @param name: The C{str} file name (in self.tmpDir).
+        @param data: The C{str} data to write.
+        @return: The C{str} path of the file.
+        """
+        filename = join(self.tmpDir, name)
+        with open(filename, 'w') as fp:
+            fp.write(data)
+        return filename
+
+
+class TestReadLog(_TmpDirTestCase):
+    """
+    Tests for the C{py3seq.results.readLog} function.
+    """
+    def testLinesAndValues(self):
+        """
+        All lines must be kept and 'name: value' and 'name = value' lines
+        must give values.
+        """
+        filename = self.write('log', (
+            '3SEQ run\n'
+            'Number of sequences: 5\n'
+            'Rejection threshold = 0.05\n'
+            ': no name\n'))
+        log = readLog(filename)
+        self.assertEqual(['3SEQ run', 'Number of sequences: 5',
+                          'Rejection threshold = 0.05', ': no name'],
+                         log.lines)
+        self.assertEqual({'Number of sequences': '5',
+                          'Rejection threshold': '0.05'}, log.values)
+
+
+class TestReadPValueHistogram(_TmpDirTestCase):
+    """
+    Tests for the C{py3seq.results.readPValueHistogram} function.
+    """
+    def testRows(self):
+        """
+        Numeric lines must be returned and other lines skipped.
+        """
+        filename = self.write('hist', (
+            '# p-value histogram\n'
+            'bin\tcount\n'
+            '\n'
+            '0.1\t4\n'
+            '1e-5 12\n'))
+        self.assertEqual([(0.1, 4.0), (1e-5, 12.0)],
+                         readPValueHistogram(filename))
+
+
+class TestReadLongRecombinants(_TmpDirTestCase):
+    """
+    Tests for the C{py3seq.results.readLongRecombinants} function.
+    """
+    def testRecombinants(self):
+        """
+        Each line must be returned as a typed C{Recombinant} instance.
+        """
+        filename = self.write('long', '\n'.join((
+            _RECOMBINANTS_HEADER,
+            'id1 id2 id3 0 1 6 1e-5 1 -5.0 0.0 2e-3 60 '.replace(' ', '\t') +
+            ' 1-3 &  64-66')) + '\n')
+        (recombinant,) = list(readLongRecombinants(filename))
+        self.assertEqual(('id1', 'id2', 'id3'),
+                         (recombinant.pId, recombinant.qId,
+                          recombinant.recombinantId))
+        self.assertEqual(1e-5, recombinant.p)
+        self.assertEqual(2e-3, recombinant.dsP)
+        self.assertEqual(60, recombinant.minRecLength)
+        self.assertEqual((((1, 3), (64, 66)),), recombinant.breakpoints)
+
+    def testUnrecognizedHeader(self):
+        """
+        If the file has an unrecognized header, a ValueError must be raised.
+        """
+        filename = self.write('long', 'C_ACCNUM\tlength\nid3\t300\n')
+        error = '^Unrecognized header line: C_ACCNUM\tlength$'
+        assertRaisesRegex(self, ValueError, error, list,
+                          readLongRecombinants(filename))
+
+
+class TestThreeSeqResults(_TmpDirTestCase):
+    """
+    Tests for the C{py3seq.results.ThreeSeqResults} class.
+    """
+    def setUp(self):
+        _TmpDirTestCase.setUp(self)
+        self.prefix = join(self.tmpDir, 'output')
+        self.write('output.3s.log', 'Number of sequences: 5\n')
+        self.write('output.3s.pvalHist', '0.1 4\n')
+
+    def testLazy(self):
+        """
+        No file must be read until it is accessed.
+        """
+        with patch('py3seq.results.readLog') as readLogMock:
+            ThreeSeqResults(self.prefix)
+        self.assertEqual(0, readLogMock.call_count)
+
+    def testLogCached(self):
+        """
+        The log must be read once, on first access.
+        """
+        results = ThreeSeqResults(self.prefix)
+        with patch('py3seq.results.readLog', wraps=readLog) as readLogMock:
+            self.assertEqual('5', results.log.values['Number of sequences'])
+            self.assertIs(results.log, results.log)
+        readLogMock.assert_called_once_with(self.prefix + '.3s.log')
+
+    def testPValueHistogramCached(self):
+        """
+        The p-value histogram must be read once, on first access.
+        """
+        results = ThreeSeqResults(self.prefix)
+        self.assertEqual([(0.1, 4.0)], results.pValueHistogram)
+        self.assertIs(results.pValueHistogram, results.pValueHistogram)
+
+    def testRecombinants(self):
+        """
+        The recombinants must be streamed from the recombinant file.
+        """
+        self.write('output.3s.rec', '\n'.join((
+            _RECOMBINANTS_HEADER,
+            'id1 id2 id3 0 1 6 1.0 1 3.0 5.0 4.0 6 '.replace(' ', '\t') +
+            '1-3 & 4-6')) + '\n')
+        results = ThreeSeqResults(self.prefix)
+        self.assertEqual(['id3'],
+                         [r.recombinantId for r in results.recombinants()])
+
+    def testLongRecombinants(self):
+        """
+        The longest recombinants must be streamed from their file.
+        """
+        self.write('output.3s.longRec', '\n'.join((
+            _RECOMBINANTS_HEADER,
+            'id1 id2 id3 0 1 6 1.0 1 3.0 5.0 4.0 6 '.replace(' ', '\t') +
+            '1-3 & 4-6')) + '\n')
+        results = ThreeSeqResults(self.prefix)
+        self.assertEqual(
+            ['id3'], [r.recombinantId for r in results.longRecombinants()])
+
+    def testMissingFile(self):
+        """
+        Accessing an output file that does not exist must raise an error
+        (and not affect access to other files).
+        """
+        results = ThreeSeqResults(self.prefix)
+        self.assertRaises(IOError, list, results.longRecombinants())
+        self.assertEqual([(0.1, 4.0)], results.pValueHistogram)
+
+
+class TestRecombinationAnalysisResults(TestCase):
+    """
+    Tests for the C{py3seq.RecombinationAnalysis.results} property.
+    """
+    def testNoRun(self):
+        """
+        If no analysis has been run, a RuntimeError must be raised.
+        """
+        ra = RecombinationAnalysis('table')
+        error = '^No analysis has been run yet$'
+        assertRaisesRegex(self, RuntimeError, error, getattr, ra, 'results')
+
+    def testResults(self):
+        """
+        The results must be for the output of the most recent run, and be
+        cached between runs.
+        """
+        ra = RecombinationAnalysis('table', dryRun=True)
+        ra.run('input.fasta', validate=False)
+        try:
+            results = ra.results
+            self.assertEqual(join(ra.tmpDir, _OUTPUT_PREFIX), results.prefix)
+            self.assertIs(results, ra.results)
+        finally:
+            ra.removeOutput()
+
+        ra.run('input.fasta', validate=False)
+        try:
+            self.assertIsNot(results, ra.results)
+            self.assertEqual(join(ra.tmpDir, _OUTPUT_PREFIX),
+                             ra.results.prefix)
+        finally:
+            ra.removeOutput()
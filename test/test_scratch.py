@@ -0,0 +1,321 @@
+from unittest import TestCase
+from six import assertRaisesRegex
+from fcntl import LOCK_EX, flock
+from os import getpid, listdir, mkdir
+from os.path import basename, dirname, exists, join
+from socket import gethostname
+from tempfile import mkdtemp
+import shutil
+
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+from py3seq import RecombinationAnalysis
+from py3seq.analysis import _OUTPUT_PREFIX
+from py3seq.scratch import (
+    LOCK_FILE, SCRATCH_PREFIX, ScratchPool, cleanStaleScratchDirs,
+    makeScratchDir, removeScratchDir)
+
+
+class TestMakeScratchDir(TestCase):
+    """
+    Tests for the C{py3seq.scratch.makeScratchDir} function.
+    """
+    def setUp(self):
+        self.root = mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def testName(self):
+        """
+        A scratch directory must be made in the root, with a name giving the
+        host and process id.
+        """
+        path = makeScratchDir(self.root)
+        self.assertEqual(self.root, dirname(path))
+        self.assertTrue(basename(path).startswith(
+            '%s%s-%d-' % (SCRATCH_PREFIX, gethostname(), getpid())))
+        self.assertEqual([LOCK_FILE], listdir(path))
+
+    def testInUseNotRemoved(self):
+        """
+        A scratch directory must not be removed as stale while it is in use,
+        and must be removable once it is removed by its user.
+        """
+        path = makeScratchDir(self.root)
+        self.assertEqual([], cleanStaleScratchDirs(self.root))
+        self.assertTrue(exists(path))
+        removeScratchDir(path)
+        self.assertFalse(exists(path))
+
+    def testStaleDirsRemovedOnce(self):
+        """
+        Stale directories must be removed from a root only the first time it
+        is used.
+        """
+        with patch('py3seq.scratch.cleanStaleScratchDirs') as cleanMock:
+            makeScratchDir(self.root)
+            makeScratchDir(self.root)
+        cleanMock.assert_called_once_with(self.root)
+
+
+class TestCleanStaleScratchDirs(TestCase):
+    """
+    Tests for the C{py3seq.scratch.cleanStaleScratchDirs} function.
+    """
+    def setUp(self):
+        self.root = mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def make(self, name, lockFile=True):
+        """
+        Make a directory in the root.
+
+        @param name: The C{str} directory name.
+        @param lockFile: If C{True}, make an (unlocked) lock file in the
+            directory.
+        @return: The C{str} path of the directory.
+        """
+        path = join(self.root, name)
+        mkdir(path)
+        if lockFile:
+            open(join(path, LOCK_FILE), 'w').close()
+        return path
+
+    def testRemoveStale(self):
+        """
+        Only the scratch directories on this host whose lock can be taken
+        must be removed, whatever the process id in their name.
+        """
+        host = gethostname()
+        stale = [
+            self.make('%s%s-%d-abc_123' % (SCRATCH_PREFIX, host, pid))
+            for pid in (getpid(), 1)]
+        with open(join(stale[0], 'output.3s.rec'), 'w') as fp:
+            fp.write('data\n')
+
+        inUse = self.make('%s%s-99999999-abc_123' % (SCRATCH_PREFIX, host))
+        with open(join(inUse, LOCK_FILE)) as lockFp:
+            flock(lockFp.fileno(), LOCK_EX)
+            keep = [
+                inUse,
+                self.make('%s%s-2-abc_123' % (SCRATCH_PREFIX, host),
+                          lockFile=False),
+                self.make('%sother%s-2-abc_123' % (SCRATCH_PREFIX, host)),
+                self.make('%s%s-notapid-abc_123' % (SCRATCH_PREFIX, host)),
+                self.make('unrelated-2-abc_123'),
+            ]
+            self.assertEqual(sorted(stale),
+                             sorted(cleanStaleScratchDirs(self.root)))
+
+        for path in stale:
+            self.assertFalse(exists(path))
+        for path in keep:
+            self.assertTrue(exists(path))
+
+
+class TestScratchPool(TestCase):
+    """
+    Tests for the C{py3seq.scratch.ScratchPool} class.
+    """
+    def setUp(self):
+        self.root = mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def testBadSize(self):
+        """
+        A pool size of less than 1 must result in a ValueError.
+        """
+        error = '^Scratch pool size must be at least 1$'
+        assertRaisesRegex(self, ValueError, error, ScratchPool, 0, self.root)
+
+    def testDirsMade(self):
+        """
+        The pool directories must be made in the root.
+        """
+        pool = ScratchPool(3, self.root)
+        self.assertEqual(sorted(basename(path) for path in pool.dirs),
+                         sorted(listdir(self.root)))
+
+    def testAcquireRelease(self):
+        """
+        A released directory must be emptied and be available again.
+        """
+        pool = ScratchPool(1, self.root)
+        path = pool.acquire()
+        mkdir(join(path, 'subdir'))
+        with open(join(path, 'file'), 'w') as fp:
+            fp.write('data\n')
+        pool.release(path)
+        self.assertEqual(path, pool.acquire())
+        self.assertEqual([LOCK_FILE], listdir(path))
+
+    def testAcquireTimeout(self):
+        """
+        If no directory is released in time, a RuntimeError must be raised.
+        """
+        pool = ScratchPool(1, self.root)
+        pool.acquire()
+        error = '^No scratch directory was released within 0.01 seconds$'
+        assertRaisesRegex(self, RuntimeError, error, pool.acquire, 0.01)
+
+    def testReleaseUnknown(self):
+        """
+        Releasing a directory that is not in the pool must result in a
+        ValueError.
+        """
+        pool = ScratchPool(1, self.root)
+        error = "^'/nonexistent' is not a directory of this scratch pool$"
+        assertRaisesRegex(self, ValueError, error, pool.release,
+                          '/nonexistent')
+
+    def testContextManager(self):
+        """
+        The pool directories must be removed when the context is exited.
+        """
+        with ScratchPool(2, self.root) as pool:
+            pool.acquire()
+        self.assertEqual([], listdir(self.root))
+
+
+class TestRecombinationAnalysisScratch(TestCase):
+    """
+    Tests for the scratch directory options of
+    C{py3seq.RecombinationAnalysis}.
+    """
+    def setUp(self):
+        self.root = mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def run3seq(self, ra):
+        """
+        Pretend to run 3seq, writing some output files.
+
+        @param ra: A C{RecombinationAnalysis} instance.
+        """
+        def execute(command, limits=None):
+            for suffix in '.3s.rec', '.3s.log', '.3s.longRec':
+                with open(join(ra.tmpDir, _OUTPUT_PREFIX + suffix),
+                          'w') as fp:
+                    fp.write('data\n')
+
+        with patch.object(ra.backend, 'execute', side_effect=execute):
+            ra.run('input.fasta', validate=False)
+
+    def testScratchRoot(self):
+        """
+        The output directory must be made in the scratch root.
+        """
+        ra = RecombinationAnalysis('table', scratchRoot=self.root)
+        self.run3seq(ra)
+        self.assertEqual(self.root, dirname(ra.tmpDir))
+        ra.removeOutput()
+        self.assertEqual([], listdir(self.root))
+
+    def testContextManager(self):
+        """
+        The output must be removed when the context is exited, even if there
+        is an exception.
+        """
+        with RecombinationAnalysis('table', scratchRoot=self.root) as ra:
+            self.run3seq(ra)
+            self.assertEqual(1, len(listdir(self.root)))
+        self.assertEqual([], listdir(self.root))
+        self.assertIsNone(ra.tmpDir)
+
+        try:
+            with RecombinationAnalysis('table',
+                                       scratchRoot=self.root) as ra:
+                self.run3seq(ra)
+                raise ZeroDivisionError()
+        except ZeroDivisionError:
+            pass
+        self.assertEqual([], listdir(self.root))
+
+    def testContextManagerAfterRemoveOutput(self):
+        """
+        Exiting the context must not fail if the output was already removed.
+        """
+        with RecombinationAnalysis('table', scratchRoot=self.root) as ra:
+            self.run3seq(ra)
+            ra.removeOutput()
+        self.assertEqual([], listdir(self.root))
+        self.assertIsNone(ra.tmpDir)
+
+    def testPreviousOutputRemoved(self):
+        """
+        The output directory of a previous run must be removed when there
+        is another run.
+        """
+        ra = RecombinationAnalysis('table', scratchRoot=self.root)
+        self.run3seq(ra)
+        firstTmpDir = ra.tmpDir
+        self.run3seq(ra)
+        self.assertFalse(exists(firstTmpDir))
+        self.assertEqual([basename(ra.tmpDir)], listdir(self.root))
+        ra.removeOutput()
+
+    def testContextManagerWithNoRun(self):
+        """
+        Exiting the context must not fail if no analysis was run.
+        """
+        with RecombinationAnalysis('table', scratchRoot=self.root) as ra:
+            pass
+        self.assertIsNone(ra.tmpDir)
+
+    def testKeepOnlyRecombinants(self):
+        """
+        If keepOnlyRecombinants is C{True}, only the recombinant file must be
+        left after a run.
+        """
+        ra = RecombinationAnalysis('table', scratchRoot=self.root,
+                                   keepOnlyRecombinants=True)
+        self.run3seq(ra)
+        self.assertEqual(sorted([LOCK_FILE, _OUTPUT_PREFIX + '.3s.rec']),
+                         sorted(listdir(ra.tmpDir)))
+
+    def testKeepEverything(self):
+        """
+        If keepOnlyRecombinants is C{False}, all output must be left after a
+        run.
+        """
+        ra = RecombinationAnalysis('table', scratchRoot=self.root)
+        self.run3seq(ra)
+        self.assertEqual(4, len(listdir(ra.tmpDir)))
+
+    def testPool(self):
+        """
+        Runs using a scratch pool must reuse its directories, returning the
+        directory of a previous run to the pool.
+        """
+        with ScratchPool(1, self.root) as pool:
+            ra = RecombinationAnalysis('table', scratchPool=pool)
+            self.run3seq(ra)
+            tmpDir = ra.tmpDir
+            self.assertIn(tmpDir, pool.dirs)
+            self.run3seq(ra)
+            self.assertEqual(tmpDir, ra.tmpDir)
+            ra.removeOutput()
+            self.assertIsNone(ra.tmpDir)
+            self.assertEqual([LOCK_FILE], listdir(tmpDir))
+            self.assertEqual(tmpDir, pool.acquire(0.01))
+
+    def testPoolContextManager(self):
+        """
+        Exiting the context must return a pool directory to the pool.
+        """
+        with ScratchPool(1, self.root) as pool:
+            with RecombinationAnalysis('table', scratchPool=pool) as ra:
+                self.run3seq(ra)
+                tmpDir = ra.tmpDir
+            self.assertEqual(tmpDir, pool.acquire(0.01))
+            self.assertEqual([LOCK_FILE], listdir(tmpDir))
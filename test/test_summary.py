@@ -0,0 +1,196 @@
+from unittest import TestCase
+from six import assertRaisesRegex
+from os.path import join
+from tempfile import mkdtemp
+import shutil
+
+from py3seq.analysis import _RECOMBINANTS_HEADER, _dunnSidak
+from py3seq.summary import RecombinantSummary, summarizeRecombinants
+
+
+def _line(pId, qId, cId, hs, dsP):
+    """
+    Make a recombinant file line.
+
+    @param pId: The C{str} id of parent p.
+    @param qId: The C{str} id of parent q.
+    @param cId: The C{str} id of the child.
+    @param hs: The C{str} hs value, '0' or '1'.
+    @param dsP: The C{str} Dunn-Sidak corrected p-value.
+    @return: A C{str} line (without a newline).
+    """
+    return '\t'.join((pId, qId, cId, '0', '1', '6', '0.001', hs, '-3.0',
+                      dsP, dsP, '6', '1-3 & 4-6'))
+
+
+_LINES1 = [
+    _line('id1', 'id2', 'id3', '1', '0.01'),
+    _line('id2', 'id1', 'id3', '0', '0.001'),
+    _line('id1', 'id4', 'id3', '0', '0.02'),
+]
+
+_LINES2 = [
+    _line('id1', 'id2', 'id4', '1', '0.04'),
+    _line('id5', 'id2', 'id3', '1', '0.0001'),
+]
+
+
+class TestSummarizeRecombinants(TestCase):
+    """
+    Tests for the C{py3seq.summary.summarizeRecombinants} function.
+    """
+    def setUp(self):
+        self.tmpDir = mkdtemp()
+        self.file1 = self.write('1.3s.rec', _LINES1)
+        self.file2 = self.write('2.3s.rec', _LINES2)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def write(self, name, lines):
+        """
+        Write a recombinant file.
+
+        @param name: The C{str} file name (in self.tmpDir).
+        @param lines: A C{list} of C{str} recombinant lines.
+        @return: The C{str} path of the file.
+        """
+        filename = join(self.tmpDir, name)
+        with open(filename, 'w') as fp:
+            fp.write('\n'.join([_RECOMBINANTS_HEADER] + lines) + '\n')
+        return filename
+
+    def check(self, chunksize):
+        """
+        Check the summary of the first file.
+
+        @param chunksize: The C{chunksize} to pass to summarizeRecombinants.
+        """
+        summary = summarizeRecombinants(self.file1, chunksize=chunksize)
+        self.assertEqual(3, summary.count)
+        self.assertEqual(1, summary.hsCount)
+        self.assertEqual(['id3'], list(summary.children))
+        self.assertEqual([('id1', 3), ('id2', 2), ('id4', 1)],
+                         summary.mostFrequentParents())
+
+        child = summary.children['id3']
+        self.assertEqual(3, child.count)
+        self.assertEqual(1, child.hsCount)
+        self.assertEqual(('id2', 'id1', 0.001),
+                         (child.bestPId, child.bestQId, child.bestDsP))
+        self.assertEqual(2, child.significantPairs())
+        self.assertEqual([('id1', 3)], child.mostFrequentParents(1))
+
+    def testOneAtATime(self):
+        """
+        Summarizing one recombinant at a time must give the expected result.
+        """
+        self.check(None)
+
+    def testChunked(self):
+        """
+        Summarizing in chunks with NumPy must give the expected result.
+        """
+        self.check(2)
+
+    def testThreshold(self):
+        """
+        Only triplets with a corrected p-value below the threshold must be
+        summarized.
+        """
+        for chunksize in None, 2:
+            summary = summarizeRecombinants(self.file1, t=0.015,
+                                            chunksize=chunksize)
+            self.assertEqual(2, summary.count)
+            child = summary.children['id3']
+            self.assertEqual(1, child.significantPairs())
+            self.assertEqual([('id1', 2), ('id2', 2)],
+                             sorted(child.mostFrequentParents()))
+
+    def testTripletCount(self):
+        """
+        If a triplet count is given, p-values must be corrected for it
+        instead of using the corrected p-values in the file.
+        """
+        for chunksize in None, 2:
+            summary = summarizeRecombinants(self.file1, t=0.015,
+                                            chunksize=chunksize,
+                                            tripletCount=10)
+            self.assertEqual(3, summary.count)
+            child = summary.children['id3']
+            self.assertAlmostEqual(_dunnSidak(0.001, 10), child.bestDsP)
+            self.assertEqual(2, child.significantPairs())
+
+    def testSeveralFilesWithTripletCount(self):
+        """
+        Files whose corrected p-values are for different numbers of triplets
+        must be comparable when a triplet count is given.
+        """
+        expected = _dunnSidak(0.001, 1000)
+        for chunksize in None, 1:
+            summary = summarizeRecombinants([self.file1, self.file2],
+                                            chunksize=chunksize,
+                                            tripletCount=1000)
+            for child in summary.children.values():
+                self.assertAlmostEqual(expected, child.bestDsP)
+
+    def testSeveralFiles(self):
+        """
+        Several files must be summarized together.
+        """
+        summary = summarizeRecombinants([self.file1, self.file2])
+        self.assertEqual(5, summary.count)
+        self.assertEqual(3, summary.hsCount)
+        self.assertEqual(['id3', 'id4'], sorted(summary.children))
+        child = summary.children['id3']
+        self.assertEqual(4, child.count)
+        self.assertEqual(('id5', 'id2', 0.0001),
+                         (child.bestPId, child.bestQId, child.bestDsP))
+        self.assertEqual(3, child.significantPairs())
+
+    def testMergeMatchesSinglePass(self):
+        """
+        Merging the summaries of separate files must give the same result as
+        summarizing them in one pass, whichever method is used.
+        """
+        expected = summarizeRecombinants([self.file1, self.file2])
+        for chunksize in None, 1:
+            merged = summarizeRecombinants(
+                self.file1, chunksize=chunksize).merge(
+                    summarizeRecombinants(self.file2, chunksize=chunksize))
+            self.assertEqual(expected.count, merged.count)
+            self.assertEqual(expected.hsCount, merged.hsCount)
+            self.assertEqual(expected.parentCounts, merged.parentCounts)
+            self.assertEqual(sorted(expected.children),
+                             sorted(merged.children))
+            for recombinantId, child in expected.children.items():
+                other = merged.children[recombinantId]
+                self.assertEqual(
+                    (child.count, child.hsCount, child.bestPId,
+                     child.bestQId, child.bestDsP, child.parentPairs,
+                     child.parentCounts),
+                    (other.count, other.hsCount, other.bestPId,
+                     other.bestQId, other.bestDsP, other.parentPairs,
+                     other.parentCounts))
+
+    def testMergeDifferentThresholds(self):
+        """
+        Merging summaries with different thresholds must raise a
+        ValueError.
+        """
+        error = (r'^Cannot merge summaries with different thresholds '
+                 r'\(0.01 and None\)$')
+        assertRaisesRegex(self, ValueError, error,
+                          RecombinantSummary(0.01).merge,
+                          RecombinantSummary())
+
+    def testMergeDifferentTripletCounts(self):
+        """
+        Merging summaries with different triplet counts must raise a
+        ValueError.
+        """
+        error = (r'^Cannot merge summaries with different triplet counts '
+                 r'\(10 and None\)$')
+        assertRaisesRegex(self, ValueError, error,
+                          RecombinantSummary(tripletCount=10).merge,
+                          RecombinantSummary())
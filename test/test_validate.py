@@ -0,0 +1,241 @@
+from unittest import TestCase
+from six import assertRaisesRegex
+from os.path import join
+from tempfile import mkdtemp
+import shutil
+
+from dark.reads import Read, Reads
+
+from py3seq import RecombinationAnalysis
+from py3seq.validate import InvalidAlignmentError, validateAlignment
+
+
+class TestValidateAlignment(TestCase):
+    """
+    Tests for the C{py3seq.validate.validateAlignment} function.
+    """
+    def setUp(self):
+        self.tmpDir = mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def write(self, data):
+        """
+        Write data to a file.
+
+        @param data: The C{str} data to write.
+        @return: The C{str} file name.
+        """
+        filename = join(self.tmpDir, 'alignment')
+        with open(filename, 'w') as fp:
+            fp.write(data)
+        return filename
+
+    def testTooFewSequences(self):
+        """
+        If there are fewer than three sequences, an InvalidAlignmentError
+        must be raised.
+        """
+        reads = Reads([Read('id1', 'ACGT'), Read('id2', 'ACGT')])
+        error = (r'^Invalid alignment \(reads\): at least three sequences '
+                 r'are needed, found 2$')
+        assertRaisesRegex(self, InvalidAlignmentError, error,
+                          validateAlignment, reads)
+
+    def testUnequalLengths(self):
+        """
+        If sequence lengths differ, an InvalidAlignmentError must be raised.
+        """
+        reads = Reads([Read('id1', 'ACGT'), Read('id2', 'ACG'),
+                       Read('id3', 'ACGT')])
+        error = (r'^Invalid alignment \(reads\): sequence lengths differ '
+                 r'from the most common length \(4\): id2 \(3\)$')
+        assertRaisesRegex(self, InvalidAlignmentError, error,
+                          validateAlignment, reads)
+
+    def testIllegalCharacters(self):
+        """
+        If sequences have illegal characters, an InvalidAlignmentError must
+        be raised giving the first illegal character of each.
+        """
+        reads = Reads([Read('id1', 'ACXT'), Read('id2', 'ACGT'),
+                       Read('id3', 'AC*Z')])
+        error = (r"^Invalid alignment \(reads\): illegal characters: 'X' at "
+                 r"position 3 of id1, '\*' at position 3 of id3$")
+        assertRaisesRegex(self, InvalidAlignmentError, error,
+                          validateAlignment, reads)
+
+    def testDuplicateIds(self):
+        """
+        If ids are duplicated, an InvalidAlignmentError must be raised.
+        """
+        reads = Reads([Read('id1', 'ACGT'), Read('id2', 'ACGT'),
+                       Read('id1', 'ACGT')])
+        error = r'^Invalid alignment \(reads\): duplicate sequence ids: id1$'
+        assertRaisesRegex(self, InvalidAlignmentError, error,
+                          validateAlignment, reads)
+
+    def testAllGaps(self):
+        """
+        If a sequence is all gaps, an InvalidAlignmentError must be raised.
+        """
+        reads = Reads([Read('id1', 'ACGT'), Read('id2', '----'),
+                       Read('id3', 'ACGT')])
+        error = (r'^Invalid alignment \(reads\): sequences with no '
+                 r'nucleotides: id2$')
+        assertRaisesRegex(self, InvalidAlignmentError, error,
+                          validateAlignment, reads)
+
+    def testSeveralProblems(self):
+        """
+        All problems must be reported, and be available in the problems
+        attribute of the error.
+        """
+        reads = Reads([Read('id1', 'ACGT'), Read('id1', '---'),
+                       Read('id3', 'ACGT')])
+        try:
+            validateAlignment(reads)
+        except InvalidAlignmentError as e:
+            self.assertEqual(3, len(e.problems))
+        else:
+            self.fail('InvalidAlignmentError not raised')
+
+    def testManyExamples(self):
+        """
+        Only the first few examples of a problem must be given.
+        """
+        reads = Reads([Read('id%d' % i, 'ACG') for i in range(3)] +
+                      [Read('x%d' % i, 'ACGT') for i in range(7)] +
+                      [Read('y%d' % i, 'AC') for i in range(8)])
+        error = (r'^Invalid alignment \(reads\): sequence lengths differ '
+                 r'from the most common length \(2\): id0 \(3\), id1 \(3\), '
+                 r'id2 \(3\), x0 \(4\), x1 \(4\), \.\.\. \(5 more\)$')
+        assertRaisesRegex(self, InvalidAlignmentError, error,
+                          validateAlignment, reads)
+
+    def testStats(self):
+        """
+        The per-column gap and ambiguity statistics must be correct, with
+        lower case characters allowed.
+        """
+        reads = Reads([Read('id1', 'AC-T'), Read('id2', 'an-T'),
+                       Read('id3', 'A?GT'), Read('id4', 'ACG.')])
+        stats = validateAlignment(reads)
+        self.assertEqual(['id1', 'id2', 'id3', 'id4'], stats.ids)
+        self.assertEqual(4, stats.length)
+        self.assertEqual([0, 0, 2, 1], list(stats.columnGaps))
+        self.assertEqual([0, 2, 0, 0], list(stats.columnAmbiguities))
+        self.assertEqual([1, 1, 0, 1], list(stats.sequenceGaps))
+        self.assertEqual([0.0, 0.0, 0.5, 0.25], list(stats.gapFraction()))
+        self.assertEqual([0.0, 0.5, 0.0, 0.0],
+                         list(stats.ambiguityFraction()))
+
+    def testFasta(self):
+        """
+        A FASTA file with sequences over several lines must be read.
+        """
+        filename = self.write('>id1 x\nAC\nGT\n>id2\nACGT\n\n>id3\nAC-T\n')
+        stats = validateAlignment(filename)
+        self.assertEqual(['id1 x', 'id2', 'id3'], stats.ids)
+        self.assertEqual([0, 0, 1, 0], list(stats.columnGaps))
+
+    def testFastaWithoutHeader(self):
+        """
+        If a file said to be FASTA does not start with '>', an
+        InvalidAlignmentError must be raised.
+        """
+        filename = self.write('ACGT\n')
+        error = "FASTA data does not start with '>'"
+        assertRaisesRegex(self, InvalidAlignmentError, error,
+                          validateAlignment, filename, format_='fasta')
+
+    def testSequentialPhylip(self):
+        """
+        A sequential PHYLIP file must be read.
+        """
+        filename = self.write('3 4\nid1 ACGT\nid2 AC GT\nid3 -CGT\n')
+        stats = validateAlignment(filename)
+        self.assertEqual(['id1', 'id2', 'id3'], stats.ids)
+        self.assertEqual([1, 0, 0, 0], list(stats.columnGaps))
+
+    def testWrappedSequentialPhylip(self):
+        """
+        A sequential PHYLIP file whose sequences continue over several lines
+        must be read.
+        """
+        filename = self.write(
+            '3 8\nid1 ACGT\nACGT\nid2 ACGT\nAC\nGT\nid3\nACGT-CGT\n')
+        stats = validateAlignment(filename)
+        self.assertEqual(['id1', 'id2', 'id3'], stats.ids)
+        self.assertEqual(8, stats.length)
+        self.assertEqual([0, 0, 0, 0, 1, 0, 0, 0], list(stats.columnGaps))
+
+    def testInterleavedPhylip(self):
+        """
+        An interleaved PHYLIP file must be read.
+        """
+        filename = self.write(
+            '3 6\nid1 ACG\nid2 ACG\nid3 AC-\n\nTAA\nTAA\n-AA\n')
+        stats = validateAlignment(filename)
+        self.assertEqual(6, stats.length)
+        self.assertEqual([0, 0, 1, 1, 0, 0], list(stats.columnGaps))
+
+    def testPhylipWrongCount(self):
+        """
+        If a PHYLIP file has fewer sequences than its header says, an
+        InvalidAlignmentError must be raised.
+        """
+        filename = self.write('4 4\nid1 ACGT\nid2 ACGT\nid3 ACGT\n')
+        error = 'PHYLIP header gives 4 sequences but 3 were found'
+        assertRaisesRegex(self, InvalidAlignmentError, error,
+                          validateAlignment, filename)
+
+    def testBadPhylipHeader(self):
+        """
+        If a PHYLIP file has an unrecognized header, an InvalidAlignmentError
+        must be raised.
+        """
+        filename = self.write('hello\n')
+        error = "unrecognized PHYLIP header line 'hello'"
+        assertRaisesRegex(self, InvalidAlignmentError, error,
+                          validateAlignment, filename)
+
+    def testUnknownFormat(self):
+        """
+        If an unknown format is given, a ValueError must be raised.
+        """
+        filename = self.write('>id1\nACGT\n')
+        error = "^Unknown alignment format 'nexus'$"
+        assertRaisesRegex(self, ValueError, error, validateAlignment,
+                          filename, format_='nexus')
+
+
+class TestRunValidation(TestCase):
+    """
+    Tests for the validation of input by C{py3seq.RecombinationAnalysis}.
+    """
+    def testInvalidReads(self):
+        """
+        If run is given an invalid alignment, an InvalidAlignmentError must
+        be raised without making a temporary directory or running 3seq.
+        """
+        ra = RecombinationAnalysis('table', dryRun=True)
+        reads = Reads([Read('id1', 'ACGT'), Read('id2', 'ACG'),
+                       Read('id3', 'ACGT')])
+        self.assertRaises(InvalidAlignmentError, ra.run, reads)
+        self.assertIsNone(ra.tmpDir)
+        self.assertFalse(any(line.startswith('$ ')
+                             for line in ra.executor.log))
+
+    def testAlignmentStats(self):
+        """
+        If run is given a valid alignment, the alignment statistics must be
+        stored.
+        """
+        ra = RecombinationAnalysis('table', dryRun=True)
+        reads = Reads([Read('id1', 'ACGT'), Read('id2', 'ACG-'),
+                       Read('id3', 'ACGT')])
+        ra.run(reads)
+        ra.removeOutput()
+        self.assertEqual([0, 0, 0, 1], list(ra.alignmentStats.columnGaps))